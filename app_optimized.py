@@ -1,31 +1,57 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import roc_auc_score
-import numpy as np
 import os
+import time
+import dataset
+import spatial_index
+import timeseries
+from jobs import JobManager, JobCancelled
+from query_backend import QUERY_BACKEND, summarize_years
+from startup import lazy_import, import_report, PROFILE_IMPORTS, DEFAULT_YEAR
 
 st.set_page_config(page_title="Dashboard de Acidentes de Trânsito", layout="wide")
-@st.cache_data
+@st.cache_resource
+def get_job_manager():
+    # Um pool de processos por servidor, compartilhado por todas as sessões
+    return JobManager()
+
+def year_sources(years):
+    # Arquivos de origem dos anos: o resultado guardado no JobManager vale enquanto eles não mudarem
+    return [path for year in years for path in dataset.year_file_paths(year).values()]
+
+def run_job(key, label, fn, *args, sources=()):
+    """
+    Executa `fn` em segundo plano, mostrando o progresso e um botão de cancelar.
+
+    O cancelamento só interrompe a tarefa se nenhuma outra sessão estiver
+    esperando pelo mesmo resultado; para esta sessão, levanta `JobCancelled`.
+    """
+    manager = get_job_manager()
+    job = manager.submit(key, fn, *args, sources=sources)
+    cancel = False
+    try:
+        if not job.done():
+            placeholder = st.empty()
+            with placeholder.container():
+                bar = st.progress(0.0, text=label)
+                cancel = st.button("Cancelar", key=f"cancel_{key}")
+                while not cancel and not job.done():
+                    fraction, message = job.progress()
+                    bar.progress(fraction, text=f"{label}: {message}")
+                    time.sleep(0.2)
+            placeholder.empty()
+    finally:
+        manager.detach(job, cancel=cancel)
+    if cancel:
+        raise JobCancelled(job.id)
+    return job.result()
+
 def load_data(selected_year):
-    all_data = []
-    base_upload_path = "upload"
-    file_names = {
-        "acidentes": f"acidentes{selected_year}_todas_causas_tipos.csv",
-        "datatran": f"datatran{selected_year}.csv"
-    }
-    for key, file_name in file_names.items():
-        file_path = os.path.join(base_upload_path, file_name)
-        try:
-            df = pd.read_csv(file_path, sep=";", encoding="latin1")
-            all_data.append(df)
-        except FileNotFoundError:
-            st.warning(f"Arquivo {file_path} não encontrado. Pulando...")
-        except Exception as e:
-            st.error(f"Erro ao carregar {file_path}: {e}")
-    return pd.concat(all_data, ignore_index=True) if all_data else pd.DataFrame()
+    # O cache em disco é compartilhado entre réplicas e sobrevive a reinícios;
+    # o JobManager evita carregar o mesmo ano várias vezes ao mesmo tempo.
+    # Só o resumo do ano volta do processo filho, não o DataFrame inteiro
+    return run_job(("summarize_year", selected_year), f"Carregando {selected_year}",
+                   dataset.summarize_year, selected_year, sources=year_sources([selected_year]))
 
 # Função para carregar dados do IBGE
 @st.cache_data
@@ -40,53 +66,74 @@ def load_ibge_data():
         st.error(f"Erro ao carregar {file_path}: {e}")
     return pd.DataFrame()
 
+# Índice de busca semântica do catálogo do IBGE
+@st.cache_resource
+def load_ibge_search_index():
+    import ibge_search
+    return ibge_search.load_or_build_index(), ibge_search.load_catalog()
+
 # Título principal
 st.title("🚗 Dashboard de Análise de Acidentes de Trânsito")
 st.markdown("---")
 
 # Seleção do Ano
-current_year = 2023
+current_year = DEFAULT_YEAR
 available_years = [2020, 2021, 2022, 2023, 2024, 2025]
-selected_year = st.sidebar.selectbox(
-    "Selecione o Ano dos Dados",
-    available_years,
-    index=available_years.index(current_year)
-)
-
-df = load_data(selected_year)
+if QUERY_BACKEND == "duckdb":
+    # Backend colunar: vários anos consultados direto dos arquivos
+    selected_years = st.sidebar.multiselect(
+        "Selecione os Anos dos Dados",
+        available_years,
+        default=[current_year]
+    )
+    if not selected_years:
+        st.info("Selecione pelo menos um ano na barra lateral.")
+        st.stop()
+    query_years = tuple(sorted(selected_years))
+    years_label = ", ".join(str(year) for year in query_years)
+    try:
+        total_records, data_columns, aggregates, map_bins = run_job(
+            ("summarize_years", query_years), f"Consultando {years_label}",
+            summarize_years, selected_years, sources=year_sources(query_years))
+    except JobCancelled:
+        st.info("Consulta cancelada. Altere a seleção de anos para recomeçar.")
+        st.stop()
+else:
+    selected_year = st.sidebar.selectbox(
+        "Selecione o Ano dos Dados",
+        available_years,
+        index=available_years.index(current_year)
+    )
+    query_years = (selected_year,)
+    years_label = str(selected_year)
+    try:
+        total_records, data_columns, aggregates, map_bins, load_problems = load_data(selected_year)
+    except JobCancelled:
+        st.info("Carregamento cancelado. Selecione o ano novamente para recomeçar.")
+        st.stop()
+    for level, message in load_problems:
+        getattr(st, level)(message)
 
-if df.empty:
+if total_records == 0:
     st.error("❌ Não foi possível carregar os dados. Verifique os arquivos CSV.")
 else:
     # Sidebar com informações
     st.sidebar.header("📊 Informações dos Dados")
-    st.sidebar.metric("Total de Registros", len(df))
-    st.sidebar.metric("Ano Selecionado", selected_year)
-
-    # Limpeza básica
-    df.columns = df.columns.str.lower()
-    if "data_inversa" in df.columns:
-        df["data_inversa"] = pd.to_datetime(df["data_inversa"], errors="coerce")
-        df["ano"] = df["data_inversa"].dt.year
-        df["mes"] = df["data_inversa"].dt.month
-        df["dia_semana_num"] = df["data_inversa"].dt.dayofweek
-    if "horario" in df.columns:
-        df["hora"] = pd.to_datetime(df["horario"], format="%H:%M:%S", errors="coerce").dt.hour
-    for col in ["km", "pessoas", "mortos", "feridos", "veiculos"]:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
-    if "latitude" in df.columns and "longitude" in df.columns:
-        df["latitude"] = df["latitude"].str.replace(",", ".").astype(float)
-        df["longitude"] = df["longitude"].str.replace(",", ".").astype(float)
-    else:
+    st.sidebar.metric("Total de Registros", total_records)
+    st.sidebar.metric("Ano Selecionado", years_label)
+
+    if "latitude" not in data_columns or "longitude" not in data_columns:
         st.warning("Colunas 'latitude' ou 'longitude' não encontradas. O mapa de calor pode não funcionar.")
 
+    # Plotly só é importado quando há dados para desenhar
+    px = lazy_import("plotly.express")
+
     # Layout de gráficos
     col1, col2 = st.columns(2)
     with col1:
         st.subheader("🔥 Mapa de Calor: Acidentes por UF e Tipo")
-        if "uf" in df.columns and "tipo_acidente" in df.columns:
-            heatmap_data = df.groupby(["uf", "tipo_acidente"]).size().unstack(fill_value=0)
+        if "heatmap" in aggregates:
+            heatmap_data = aggregates["heatmap"]
             fig_heatmap = px.imshow(
                 heatmap_data,
                 text_auto=True,
@@ -98,8 +145,8 @@ else:
             st.plotly_chart(fig_heatmap, use_container_width=True)
     with col2:
         st.subheader("⏰ Risco de Acidentes por Horário")
-        if "hora" in df.columns:
-            risk_by_hour = df.groupby("hora").size().reset_index(name="acidentes")
+        if "risk_by_hour" in aggregates:
+            risk_by_hour = aggregates["risk_by_hour"]
             fig_risk = px.line(
                 risk_by_hour,
                 x="hora",
@@ -112,8 +159,8 @@ else:
             st.plotly_chart(fig_risk, use_container_width=True)
 
     st.subheader("📈 Principais Causas de Acidentes")
-    if "causa_acidente" in df.columns:
-        top_causes = df["causa_acidente"].value_counts().head(10)
+    if "top_causes" in aggregates:
+        top_causes = aggregates["top_causes"]
         fig_causes = px.bar(
             x=top_causes.values,
             y=top_causes.index,
@@ -127,9 +174,9 @@ else:
 
     col3, col4 = st.columns(2)
     with col3:
-        if "dia_semana" in df.columns:
+        if "day_counts" in aggregates:
             st.subheader("📅 Acidentes por Dia da Semana")
-            day_counts = df["dia_semana"].value_counts()
+            day_counts = aggregates["day_counts"]
             fig_days = px.pie(
                 values=day_counts.values,
                 names=day_counts.index,
@@ -137,9 +184,9 @@ else:
             )
             st.plotly_chart(fig_days, use_container_width=True)
     with col4:
-        if "condicao_metereologica" in df.columns:
+        if "weather_counts" in aggregates:
             st.subheader("🌤️ Condições Meteorológicas")
-            weather_counts = df["condicao_metereologica"].value_counts().head(8)
+            weather_counts = aggregates["weather_counts"]
             fig_weather = px.bar(
                 x=weather_counts.index,
                 y=weather_counts.values,
@@ -150,10 +197,8 @@ else:
 
     st.markdown("---")
     st.header("🗺️ Mapa de Densidade de Risco de Acidentes")
-    if "latitude" in df.columns and "longitude" in df.columns:
-        if "risco" not in df.columns:
-            df["risco"] = df.groupby(["latitude", "longitude"])["latitude"].transform("count")
-        df_map = df[df["risco"] > 0]
+    if "latitude" in data_columns and "longitude" in data_columns:
+        df_map = map_bins[map_bins["risco"] > 0]
         if not df_map.empty:
             fig_density_map = px.density_mapbox(
                 df_map,
@@ -172,14 +217,92 @@ else:
             st.subheader("🔝 Top 10 Trechos Críticos (por Risco)")
             top_10_risco = df_map.nlargest(10, "risco")
             if not top_10_risco.empty:
-                st.dataframe(top_10_risco[["latitude", "longitude", "risco", "uf", "br", "km"]])
+                st.dataframe(top_10_risco[[c for c in ["latitude", "longitude", "risco", "uf", "br", "km"] if c in top_10_risco.columns]])
             else:
                 st.info("Nenhum trecho com risco significativo encontrado.")
         else:
             st.info("Nenhum dado com risco > 0 para exibir.")
+
+        st.subheader("📍 Consulta por Coordenadas")
+        with st.form("spatial_query"):
+            col_lat, col_lon, col_radius, col_k = st.columns(4)
+            query_lat = col_lat.number_input("Latitude", value=-23.55, min_value=-90.0, max_value=90.0, format="%.5f")
+            query_lon = col_lon.number_input("Longitude", value=-46.63, min_value=-180.0, max_value=180.0, format="%.5f")
+            query_radius = col_radius.number_input("Raio (km)", value=2.0, min_value=0.1, max_value=500.0)
+            query_k = col_k.number_input("Mais próximos (k)", value=10, min_value=1, max_value=1000)
+            spatial_submit = st.form_submit_button("Consultar")
+        if spatial_submit:
+            try:
+                index = run_job(("spatial_index", query_years), "Construindo o índice espacial",
+                                spatial_index.load_index, query_years, sources=year_sources(query_years))
+            except JobCancelled:
+                st.info("Construção do índice cancelada.")
+            else:
+                st.metric(f"Acidentes a até {query_radius:g} km",
+                          index.count_within(query_lat, query_lon, query_radius))
+                st.dataframe(index.nearest(query_lat, query_lon, int(query_k)))
     else:
         st.warning("Colunas 'latitude' ou 'longitude' não disponíveis para o mapa de densidade.")
 
+    st.markdown("---")
+    st.header("📉 Tendências e Sazonalidade")
+    if "data_inversa" in data_columns:
+        try:
+            cube = run_job(("timeseries", query_years), "Montando séries temporais",
+                           timeseries.load_cube, query_years, sources=year_sources(query_years))
+        except JobCancelled:
+            cube = None
+            st.info("Montagem das séries temporais cancelada.")
+        if cube is not None:
+            col_uf, col_br, col_tipo = st.columns(3)
+            groups = cube.select(
+                uf=col_uf.multiselect("UF", cube.options("uf")),
+                br=col_br.multiselect("BR", cube.options("br")),
+                tipo_acidente=col_tipo.multiselect("Tipo de acidente", cube.options("tipo_acidente")),
+            )
+            daily = cube.daily_series(groups)
+            trend = pd.DataFrame({
+                "acidentes": daily,
+                "média 7 dias": cube.rolling_mean(daily, 7),
+                "média 30 dias": cube.rolling_mean(daily, 30),
+            }, index=daily.index)
+            fig_trend = px.line(trend, title="Acidentes por Dia e Médias Móveis")
+            fig_trend.update_layout(height=400, xaxis_title="", yaxis_title="acidentes")
+            st.plotly_chart(fig_trend, use_container_width=True)
+
+            col5, col6 = st.columns(2)
+            with col5:
+                monthly = cube.resample(daily, "M")
+                fig_monthly = px.bar(x=monthly.index, y=monthly.values, title="Acidentes por Mês")
+                fig_monthly.update_layout(xaxis_title="", yaxis_title="acidentes")
+                st.plotly_chart(fig_monthly, use_container_width=True)
+            with col6:
+                day_types = cube.day_type_profile(groups)
+                fig_day_types = px.bar(x=day_types.index, y=day_types.values,
+                                       title="Média Diária: Dias Úteis, Fins de Semana e Feriados")
+                fig_day_types.update_layout(xaxis_title="", yaxis_title="acidentes por dia")
+                st.plotly_chart(fig_day_types, use_container_width=True)
+
+            fig_profile = px.imshow(
+                cube.weekday_hour_profile(groups),
+                aspect="auto",
+                color_continuous_scale="Reds",
+                labels=dict(x="hora", y="", color="média"),
+                title="Média de Acidentes por Dia da Semana e Hora"
+            )
+            st.plotly_chart(fig_profile, use_container_width=True)
+
+            if len(query_years) > 1:
+                st.subheader("📆 Comparação Ano a Ano")
+                yoy = cube.year_over_year(groups)
+                fig_yoy = px.line(yoy, x="mes", y="acidentes", color=yoy["ano"].astype(str), markers=True,
+                                  title="Acidentes por Mês em Cada Ano")
+                fig_yoy.update_layout(legend_title_text="ano")
+                st.plotly_chart(fig_yoy, use_container_width=True)
+                st.dataframe(yoy.dropna(subset=["ano_anterior"]).round({"variacao_pct": 1}))
+    else:
+        st.warning("Coluna 'data_inversa' não disponível para as séries temporais.")
+
     st.markdown("---")
     st.header("🧠 Pergunte ao chat")
     st.info("Para usar integração com Ollama, instale e inicie o serviço, etc.")
@@ -190,7 +313,7 @@ else:
     if st.button("🤖 Perguntar à LLM"):
         try:
             import ollama
-            data_context = f"Dados de acidentes: Total={len(df)}"
+            data_context = f"Dados de acidentes: Total={total_records}"
             prompt = f"{data_context}\nPergunta: {user_question}"
             response = ollama.chat(
                 model="llama3.1",
@@ -205,7 +328,16 @@ else:
     ibge_df = load_ibge_data()
     if not ibge_df.empty:
         st.success("Dados do IBGE carregados com sucesso!")
-        st.dataframe(ibge_df.head(80))
+        ibge_query = st.text_input("🔎 Buscar indicadores do IBGE", placeholder="Ex.: mortalidade no trânsito")
+        if ibge_query:
+            try:
+                import ibge_search
+                ibge_index, ibge_catalog = load_ibge_search_index()
+                st.dataframe(ibge_search.search(ibge_query, ibge_index, ibge_catalog, k=20))
+            except Exception as e:
+                st.error(f"Erro na busca semântica: {e}")
+        else:
+            st.dataframe(ibge_df.head(80))
         st.download_button(
             label="📥 Baixar Dados Completos do IBGE",
             data=ibge_df.to_csv(index=False).encode("utf-8"),
@@ -224,5 +356,9 @@ with st.sidebar:
     if st.button("Sair"): 
         logout()
 
+    if PROFILE_IMPORTS:
+        with st.expander("⏱️ Tempo de imports (ms)"):
+            st.json(import_report())
+
     st.markdown("---")
     st.markdown("**Dashboard desenvolvido por Arthur Pedro e Pedro Lacerda** 🤓🚀")
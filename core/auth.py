@@ -1,13 +1,11 @@
-import bcrypt
 import os
 import time
-import json
 import uuid
-from pathlib import Path
 from dotenv import load_dotenv
-from authlib.integrations.starlette_client import OAuth
-from authlib.integrations.base_client import OAuthError
 import streamlit as st
+from core.user_store import get_store
+from core.password_pool import get_pool, needs_rehash, PasswordPoolBusy
+from core.rate_limit import get_limiter, client_address, LoginThrottled
 
 load_dotenv()
 
@@ -15,90 +13,81 @@ SECRET_KEY = os.getenv("SECRET_KEY", "chave_padrao_apenas_para_desenvolvimento")
 SESSION_EXPIRY = int(os.getenv("SESSION_EXPIRY", 1800))
 LOGIN_ATTEMPTS_LIMIT = int(os.getenv("LOGIN_ATTEMPTS_LIMIT", 5))
 
-USERS_FILE = Path(__file__).parent.parent / "data" / "users.json"
-
-USERS_FILE.parent.mkdir(exist_ok=True)
-
-if not USERS_FILE.exists():
-    with open(USERS_FILE, "w") as f:
-        json.dump({"users": []}, f)
-
 def load_users():
-    """Carrega os usuários do arquivo JSON."""
-    try:
-        with open(USERS_FILE, "r") as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        return {"users": []}
+    """Carrega todos os usuários do armazenamento."""
+    return {"users": get_store().all_users()}
 
 def save_users(users_data):
-    """Salva os dados dos usuários no arquivo JSON."""
-    with open(USERS_FILE, "w") as f:
-        json.dump(users_data, f, indent=2)
+    """Grava os usuários informados, inserindo os novos e atualizando os existentes."""
+    store = get_store()
+    with store.transaction():
+        for user in users_data.get("users", []):
+            if not store.insert(user):
+                store.update(user["email"], **{k: v for k, v in user.items() if k != "email"})
 
 def get_user_by_email(email):
     """Busca um usuário pelo e-mail."""
-    users_data = load_users()
-    for user in users_data.get("users", []):
-        if user.get("email") == email:
-            return user
-    return None
+    return get_store().get_by_email(email)
 
 def get_user_by_oauth(provider, provider_id):
     """Busca um usuário pelo ID do provedor OAuth."""
-    users_data = load_users()
-    for user in users_data.get("users", []):
-        if user.get("oauth_provider") == provider and user.get("oauth_id") == provider_id:
-            return user
-    return None
+    return get_store().get_by_oauth(provider, provider_id)
 
 def hash_password(password):
-    """Gera o hash de uma senha usando bcrypt."""
-    hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-    return hashed.decode('utf-8')
+    """Gera o hash de uma senha usando bcrypt, no pool de senhas."""
+    return get_pool().hash(password)
 
 def verify_credentials(email, password, hashed_password):
     """Verifica se a senha fornecida corresponde ao hash armazenado."""
     try:
-        return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+        return get_pool().verify(password, hashed_password)
     except ValueError:
         # Hash inválido ou outro erro de verificação
         return False
 
+def rehash_password_if_needed(email, password, hashed_password):
+    """Regrava o hash com o custo atual quando ele foi gerado com outro custo."""
+    if not needs_rehash(hashed_password):
+        return
+    try:
+        get_store().update(email, password=hash_password(password))
+        print(f"[AUTH] rehash_password_if_needed: Hash de {email} atualizado para custo {get_pool().rounds}")
+    except PasswordPoolBusy:
+        # O rehash é oportunista: fica para o próximo login
+        pass
+
 def register_user(email, password=None, name=None, oauth_provider=None, oauth_id=None):
     """Registra um novo usuário ou atualiza um existente com dados OAuth."""
-    users_data = load_users()
-    
-    # Verificar se o usuário já existe pelo e-mail
-    existing_user = get_user_by_email(email)
-    
-    if existing_user:
-        # Se o usuário já existe, atualiza com os dados OAuth se fornecidos
+    # O hash é calculado fora da transação para não segurar o lock de escrita
+    hashed_password = hash_password(password) if password else None
+    store = get_store()
+
+    with store.transaction():
+        # Verificar se o usuário já existe pelo e-mail
+        existing_user = store.get_by_email(email)
+
+        if existing_user:
+            # Se o usuário já existe, atualiza com os dados OAuth se fornecidos
+            if oauth_provider and oauth_id:
+                return store.update(email, oauth_provider=oauth_provider, oauth_id=oauth_id)
+            return False # Usuário já existe e não é uma atualização OAuth
+
+        # Criar novo usuário
+        new_user = {
+            "id": str(uuid.uuid4()),
+            "email": email,
+            "name": name if name else email.split('@')[0],
+            "created_at": time.time()
+        }
+
+        if hashed_password:
+            new_user["password"] = hashed_password
+
         if oauth_provider and oauth_id:
-            existing_user["oauth_provider"] = oauth_provider
-            existing_user["oauth_id"] = oauth_id
-            save_users(users_data)
-            return True
-        return False # Usuário já existe e não é uma atualização OAuth
-    
-    # Criar novo usuário
-    new_user = {
-        "id": str(uuid.uuid4()),
-        "email": email,
-        "name": name if name else email.split('@')[0],
-        "created_at": time.time()
-    }
-    
-    if password:
-        new_user["password"] = hash_password(password)
-    
-    if oauth_provider and oauth_id:
-        new_user["oauth_provider"] = oauth_provider
-        new_user["oauth_id"] = oauth_id
-        
-    users_data["users"].append(new_user)
-    save_users(users_data)
-    return True
+            new_user["oauth_provider"] = oauth_provider
+            new_user["oauth_id"] = oauth_id
+
+        return store.insert(new_user)
 
 def init_session():
     """Inicializa o estado da sessão do Streamlit."""
@@ -118,7 +107,7 @@ def login_user(user):
     st.session_state.user = user
     st.session_state.login_attempts = 0 
     st.session_state.last_activity = time.time()
-    print(f"[AUTH] login_user: Usuário {user["email"]} logado. st.session_state.auth = {st.session_state.auth}")
+    print(f"[AUTH] login_user: Usuário {user['email']} logado. st.session_state.auth = {st.session_state.auth}")
 
 def logout_user():
     """Limpa o estado da sessão para deslogar o usuário."""
@@ -128,11 +117,26 @@ def logout_user():
     st.session_state.last_activity = time.time()
     print(f"[AUTH] logout_user: st.session_state.auth = {st.session_state.auth}")
 
-def authenticate_email_password(email, password):
-    """Autentica um usuário com e-mail e senha."""
+def get_client_id():
+    """Identifica o cliente da sessão atual (conexão direta ou, atrás de proxy confiável, X-Forwarded-For)."""
+    try:
+        return client_address(st.context.ip_address, st.context.headers.get("X-Forwarded-For"))
+    except Exception:
+        return None
+
+def authenticate_email_password(email, password, client=None):
+    """
+    Autentica um usuário com e-mail e senha.
+
+    O limite de tentativas por e-mail e por cliente é verificado antes de
+    qualquer hashing. Levanta `LoginThrottled` quando ele é excedido e
+    `PasswordPoolBusy` se a fila de verificação de senhas estiver cheia.
+    """
+    get_limiter().check(email, client or get_client_id())
     user = get_user_by_email(email)
     if user and "password" in user:
         if verify_credentials(email, password, user["password"]):
+            rehash_password_if_needed(email, password, user["password"])
             login_user(user)
             print(f"[AUTH] authenticate_email_password: Resultado da autenticação para {email}: True")
             return True
@@ -162,6 +166,8 @@ def check_session_expiry():
 
 def init_oauth():
     """Inicializa os clientes OAuth."""
+    # Import adiado: o cliente Starlette do authlib é pesado e só é usado aqui
+    from authlib.integrations.starlette_client import OAuth
     oauth = OAuth()
 
     return oauth
\ No newline at end of file
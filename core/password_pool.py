@@ -0,0 +1,133 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+import bcrypt
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", 16))
+PASSWORD_TIMEOUT = float(os.getenv("PASSWORD_TIMEOUT", 10))
+
+class PasswordPoolBusy(Exception):
+    """A fila de hashing de senhas está cheia; a requisição foi recusada."""
+
+def password_rounds(hashed_password):
+    """Extrai o custo (work factor) de um hash bcrypt. Retorna None se o hash for inválido."""
+    try:
+        return int(hashed_password.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+def needs_rehash(hashed_password, rounds=BCRYPT_ROUNDS):
+    """Indica se o hash foi gerado com um custo diferente do configurado."""
+    current = password_rounds(hashed_password)
+    return current is not None and current != rounds
+
+class PasswordPool:
+    """
+    Executa o bcrypt em um pool de threads limitado.
+
+    O bcrypt libera o GIL, então as threads do Streamlit continuam atendendo
+    outras sessões enquanto as senhas são verificadas. No máximo
+    `workers + queue_limit` tarefas ficam em andamento; além disso a
+    requisição é recusada na hora com `PasswordPoolBusy`, assim como quando
+    o resultado não sai em `timeout` segundos.
+    """
+
+    def __init__(self, workers=PASSWORD_WORKERS, queue_limit=PASSWORD_QUEUE_LIMIT,
+                 rounds=BCRYPT_ROUNDS, timeout=PASSWORD_TIMEOUT):
+        self.rounds = rounds
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._running = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._verify_count = 0
+        self._verify_latencies = deque(maxlen=1000)
+
+    def _run(self, fn, *args):
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def _release(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def run(self, fn, *args):
+        """Executa `fn(*args)` no pool e aguarda o resultado."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise PasswordPoolBusy("Servidor ocupado verificando senhas. Tente novamente em instantes.")
+        with self._lock:
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(self._run, fn, *args)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # Se ainda estava na fila, não chega a rodar
+            future.cancel()
+            with self._lock:
+                self._timed_out += 1
+            raise PasswordPoolBusy("Servidor ocupado verificando senhas. Tente novamente em instantes.") from None
+
+    def hash(self, password):
+        """Gera o hash bcrypt de uma senha com o custo configurado."""
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return self.run(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+    def verify(self, password, hashed_password):
+        """Verifica uma senha contra o hash armazenado, registrando a latência."""
+        start = time.perf_counter()
+        # Recusas e timeouts não entram na latência: puxariam o p50/p95 para
+        # baixo justamente quando o pool está saturado
+        result = self.run(bcrypt.checkpw, password.encode('utf-8'), hashed_password.encode('utf-8'))
+        with self._lock:
+            self._verify_count += 1
+            self._verify_latencies.append(time.perf_counter() - start)
+        return result
+
+    def metrics(self):
+        """Retorna profundidade da fila, recusas, timeouts e latência das verificações (em ms)."""
+        with self._lock:
+            latencies = sorted(self._verify_latencies)
+            metrics = {
+                "queue_depth": self._in_flight - self._running,
+                "running": self._running,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "verify_count": self._verify_count,
+            }
+        if latencies:
+            metrics["verify_p50_ms"] = latencies[len(latencies) // 2] * 1000
+            metrics["verify_p95_ms"] = latencies[int(len(latencies) * 0.95)] * 1000
+            metrics["verify_max_ms"] = latencies[-1] * 1000
+        return metrics
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Retorna o pool de senhas compartilhado pelo processo."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PasswordPool()
+    return _pool
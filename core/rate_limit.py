@@ -0,0 +1,206 @@
+import os
+import time
+import ipaddress
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+LOGIN_RATE_BACKEND = os.getenv("LOGIN_RATE_BACKEND", "memory")
+LOGIN_RATE_DB = Path(os.getenv("LOGIN_RATE_DB", DATA_DIR / "login_throttle.db"))
+# Por e-mail: rajada de 5 tentativas, recarregando uma a cada 60 s
+LOGIN_RATE_EMAIL_CAPACITY = int(os.getenv("LOGIN_RATE_EMAIL_CAPACITY", 5))
+LOGIN_RATE_EMAIL_REFILL_SECONDS = float(os.getenv("LOGIN_RATE_EMAIL_REFILL_SECONDS", 60))
+# Por cliente (IP): rajada maior, pois vários usuários podem compartilhar o mesmo IP
+LOGIN_RATE_CLIENT_CAPACITY = int(os.getenv("LOGIN_RATE_CLIENT_CAPACITY", 20))
+LOGIN_RATE_CLIENT_REFILL_SECONDS = float(os.getenv("LOGIN_RATE_CLIENT_REFILL_SECONDS", 6))
+# Buckets cheios são removidos do SQLite a cada N consumos
+LOGIN_RATE_PRUNE_EVERY = int(os.getenv("LOGIN_RATE_PRUNE_EVERY", 1000))
+# IPs/redes dos proxies reversos cujo X-Forwarded-For é confiável (vazio = ignora o cabeçalho)
+TRUSTED_PROXIES = [p.strip() for p in os.getenv("TRUSTED_PROXIES", "").split(",") if p.strip()]
+
+class LoginThrottled(Exception):
+    """Muitas tentativas de login para o mesmo e-mail ou cliente."""
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(
+            f"Muitas tentativas de login. Tente novamente em {max(1, round(retry_after))} segundos."
+        )
+
+def _in_networks(address, networks):
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+def client_address(peer, forwarded=None, trusted_proxies=TRUSTED_PROXIES):
+    """
+    Endereço do cliente para o limite por cliente.
+
+    O `X-Forwarded-For` só é usado com `trusted_proxies` configurado e quando
+    a conexão direta (`peer`) vem de um deles (ou é local). Nesse caso vale o
+    hop mais à direita que não é um proxy confiável: os anteriores são
+    informados pelo próprio cliente e podem ser trocados a cada tentativa.
+    """
+    networks = [ipaddress.ip_network(p, strict=False) for p in trusted_proxies]
+    if not networks or not forwarded or (peer and not _in_networks(peer, networks)):
+        return peer
+    hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _in_networks(hop, networks):
+            return hop
+    return hops[0] if hops else peer
+
+def _refill(tokens, updated, now, capacity, refill_seconds):
+    return min(capacity, tokens + (now - updated) / refill_seconds)
+
+class MemoryTokenBucket:
+    """
+    Token bucket em memória, compartilhado por todas as sessões do processo.
+
+    Guarda no máximo `max_keys` chaves, descartando as menos usadas.
+    """
+
+    def __init__(self, capacity, refill_seconds, max_keys=100_000):
+        self.capacity = capacity
+        self.refill_seconds = refill_seconds
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, now=None):
+        """Consome um token de `key`. Retorna 0 se permitido, ou os segundos até o próximo token."""
+        now = time.time() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.capacity, now))
+            tokens = _refill(tokens, updated, now, self.capacity, self.refill_seconds)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return 0 if allowed else (1 - tokens) * self.refill_seconds
+
+class SQLiteTokenBucket:
+    """
+    Token bucket em SQLite, compartilhado entre processos e réplicas no mesmo host.
+
+    Cada consumo é uma transação `BEGIN IMMEDIATE` de uma linha. A cada
+    `prune_every` consumos os buckets já cheios são apagados, para a tabela
+    não crescer sem limite com e-mails e IPs de ataques.
+    """
+
+    def __init__(self, capacity, refill_seconds, db_path=LOGIN_RATE_DB, namespace="login",
+                 prune_every=LOGIN_RATE_PRUNE_EVERY):
+        self.capacity = capacity
+        self.refill_seconds = refill_seconds
+        self.db_path = Path(db_path)
+        self.namespace = namespace
+        self.prune_every = prune_every
+        self._consumed = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def consume(self, key, now=None):
+        """Consome um token de `key`. Retorna 0 se permitido, ou os segundos até o próximo token."""
+        now = time.time() if now is None else now
+        key = f"{self.namespace}:{key}"
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError:
+                # Banco travado além do timeout: recusa a tentativa em vez de
+                # mostrar o erro na página de login
+                return 1.0
+            try:
+                row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens, updated = row if row else (self.capacity, now)
+                tokens = _refill(tokens, updated, now, self.capacity, self.refill_seconds)
+                allowed = tokens >= 1
+                if allowed:
+                    tokens -= 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                    (key, tokens, now),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._consumed += 1
+            prune = self.prune_every and self._consumed % self.prune_every == 0
+        if prune:
+            self.prune(now)
+        return 0 if allowed else (1 - tokens) * self.refill_seconds
+
+    def prune(self, now=None):
+        """Remove os buckets que já estariam cheios (equivalentes a chave ausente)."""
+        now = time.time() if now is None else now
+        full_after = self.capacity * self.refill_seconds
+        with self._lock:
+            try:
+                self._connect().execute(
+                    "DELETE FROM buckets WHERE key LIKE ? AND updated < ?",
+                    (f"{self.namespace}:%", now - full_after),
+                )
+            except sqlite3.OperationalError:
+                # Limpeza é oportunista: fica para a próxima rodada
+                pass
+
+class LoginLimiter:
+    """
+    Limita tentativas de login por e-mail e por cliente antes de qualquer bcrypt.
+
+    Recusar uma tentativa custa microssegundos (memória) ou uma transação
+    SQLite curta, em vez de centenas de milissegundos de CPU.
+    """
+
+    def __init__(self, backend=LOGIN_RATE_BACKEND):
+        if backend == "sqlite":
+            self.email_bucket = SQLiteTokenBucket(
+                LOGIN_RATE_EMAIL_CAPACITY, LOGIN_RATE_EMAIL_REFILL_SECONDS, namespace="email")
+            self.client_bucket = SQLiteTokenBucket(
+                LOGIN_RATE_CLIENT_CAPACITY, LOGIN_RATE_CLIENT_REFILL_SECONDS, namespace="client")
+        elif backend == "memory":
+            self.email_bucket = MemoryTokenBucket(LOGIN_RATE_EMAIL_CAPACITY, LOGIN_RATE_EMAIL_REFILL_SECONDS)
+            self.client_bucket = MemoryTokenBucket(LOGIN_RATE_CLIENT_CAPACITY, LOGIN_RATE_CLIENT_REFILL_SECONDS)
+        else:
+            raise ValueError(f"LOGIN_RATE_BACKEND inválido: {backend} (use 'memory' ou 'sqlite')")
+
+    def check(self, email, client=None):
+        """Levanta `LoginThrottled` se o e-mail ou o cliente excederam o limite."""
+        retry_after = self.email_bucket.consume(email.strip().lower())
+        if client:
+            retry_after = max(retry_after, self.client_bucket.consume(client))
+        if retry_after:
+            raise LoginThrottled(retry_after)
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_limiter():
+    """Retorna o limitador de login compartilhado pelo processo."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = LoginLimiter()
+    return _limiter
@@ -0,0 +1,204 @@
+import os
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+USERS_DB = Path(os.getenv("USERS_DB", DATA_DIR / "users.db"))
+USERS_JSON = DATA_DIR / "users.json"
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 1024))
+
+USER_COLUMNS = ("id", "email", "name", "password", "oauth_provider", "oauth_id", "created_at")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    name TEXT,
+    password TEXT,
+    oauth_provider TEXT,
+    oauth_id TEXT,
+    created_at REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_oauth
+    ON users (oauth_provider, oauth_id)
+    WHERE oauth_provider IS NOT NULL AND oauth_id IS NOT NULL;
+"""
+
+class UserStore:
+    """
+    Armazenamento de usuários em SQLite (modo WAL).
+
+    E-mail e (oauth_provider, oauth_id) têm índices únicos, as escritas são
+    transações atômicas e as leituras passam por um cache em memória do
+    processo. O cache é invalidado nas escritas locais e quando outro
+    processo grava no banco (detectado por `PRAGMA data_version`); guarda só
+    usuários encontrados, até `cache_size` entradas (LRU).
+    """
+
+    def __init__(self, db_path=USERS_DB, json_path=USERS_JSON, cache_size=USER_CACHE_SIZE):
+        self.db_path = Path(db_path)
+        self.json_path = Path(json_path) if json_path else None
+        self._lock = threading.RLock()
+        self._conn = None
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_version = None
+
+    def _connect(self):
+        # Uma única conexão por processo: `PRAGMA data_version` só é comparável
+        # dentro da mesma conexão, e o lock serializa o acesso entre threads.
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+            empty = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0
+            if empty and self.json_path and self.json_path.exists():
+                self.migrate_from_json(self.json_path)
+        return self._conn
+
+    def _cached(self, key, query, params):
+        with self._lock:
+            conn = self._connect()
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._cache_version:
+                self._cache.clear()
+                self._cache_version = version
+            user = self._cache.get(key)
+            if user is not None:
+                self._cache.move_to_end(key)
+            else:
+                # Buscas sem resultado não entram no cache: e-mails sondados
+                # por tentativas de login não ocupam memória
+                user = self._row_to_user(conn.execute(query, params).fetchone())
+                if user is not None:
+                    self._cache[key] = user
+                    while len(self._cache) > self._cache_size:
+                        self._cache.popitem(last=False)
+        return dict(user) if user else None
+
+    def invalidate(self):
+        """Descarta o cache de leitura do processo."""
+        with self._lock:
+            self._cache.clear()
+            self._cache_version = None
+
+    @staticmethod
+    def _row_to_user(row):
+        if row is None:
+            return None
+        return {k: row[k] for k in row.keys() if row[k] is not None}
+
+    def get_by_email(self, email):
+        """Busca um usuário pelo e-mail."""
+        return self._cached(("email", email), "SELECT * FROM users WHERE email = ?", (email,))
+
+    def get_by_oauth(self, provider, provider_id):
+        """Busca um usuário pelo ID do provedor OAuth."""
+        return self._cached(
+            ("oauth", provider, provider_id),
+            "SELECT * FROM users WHERE oauth_provider = ? AND oauth_id = ?",
+            (provider, provider_id),
+        )
+
+    def all_users(self):
+        """Lista todos os usuários."""
+        with self._lock:
+            rows = self._connect().execute("SELECT * FROM users ORDER BY created_at").fetchall()
+        return [self._row_to_user(row) for row in rows]
+
+    def insert(self, user):
+        """Insere um usuário. Retorna False se o e-mail ou o OAuth já existirem."""
+        values = [user.get(col) for col in USER_COLUMNS]
+        try:
+            with self._lock:
+                self._connect().execute(
+                    f"INSERT INTO users ({', '.join(USER_COLUMNS)}) VALUES ({', '.join('?' * len(USER_COLUMNS))})",
+                    values,
+                )
+        except sqlite3.IntegrityError:
+            return False
+        finally:
+            self.invalidate()
+        return True
+
+    def update(self, email, **fields):
+        """Atualiza campos de um usuário existente. Retorna False se ele não existir."""
+        fields = {k: v for k, v in fields.items() if k in USER_COLUMNS and k != "id"}
+        if not fields:
+            return False
+        assignments = ", ".join(f"{col} = ?" for col in fields)
+        try:
+            with self._lock:
+                cursor = self._connect().execute(
+                    f"UPDATE users SET {assignments} WHERE email = ?",
+                    [*fields.values(), email],
+                )
+        except sqlite3.IntegrityError:
+            return False
+        finally:
+            self.invalidate()
+        return cursor.rowcount > 0
+
+    def transaction(self):
+        """
+        Abre uma transação de escrita (`BEGIN IMMEDIATE`).
+
+        Bloqueia outras threads e processos escritores até o fim do bloco,
+        tornando atômicas as sequências de leitura e escrita.
+        """
+        return _Transaction(self)
+
+    def migrate_from_json(self, json_path=USERS_JSON):
+        """Importa os usuários do antigo `users.json`, ignorando os que já existem."""
+        try:
+            with open(json_path, "r") as f:
+                users = json.load(f).get("users", [])
+        except (json.JSONDecodeError, FileNotFoundError):
+            return 0
+        imported = 0
+        with self.transaction():
+            for user in users:
+                if user.get("id") and user.get("email") and self.insert(user):
+                    imported += 1
+        return imported
+
+class _Transaction:
+    def __init__(self, store):
+        self.store = store
+
+    def __enter__(self):
+        self.store._lock.acquire()
+        try:
+            conn = self.store._connect()
+            conn.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self.store._lock.release()
+            raise
+        return conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.store._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+            self.store.invalidate()
+        finally:
+            self.store._lock.release()
+        return False
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Retorna a instância compartilhada do armazenamento de usuários."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = UserStore()
+    return _store
@@ -0,0 +1,149 @@
+"""
+Carregamento, limpeza e agregações dos dados de acidentes.
+
+Funções puras em pandas, sem Streamlit, para que possam ser usadas pelo
+dashboard, pelo aquecimento de cache (`startup.py`) e por processos em
+segundo plano. `load_year_bundle` guarda os resultados no cache em disco
+compartilhado (`disk_cache.py`).
+"""
+
+import os
+import pandas as pd
+from disk_cache import get_cache
+
+UPLOAD_DIR = "upload"
+MAP_BIN_DECIMALS = int(os.getenv("MAP_BIN_DECIMALS", 2))
+NUMERIC_COLUMNS = ["km", "pessoas", "mortos", "feridos", "veiculos"]
+
+def year_file_paths(year, base_path=UPLOAD_DIR):
+    """Caminhos dos arquivos de acidentes e DataTran de um ano."""
+    return {
+        "acidentes": os.path.join(base_path, f"acidentes{year}_todas_causas_tipos.csv"),
+        "datatran": os.path.join(base_path, f"datatran{year}.csv"),
+    }
+
+def read_year(year, base_path=UPLOAD_DIR):
+    """
+    Lê e concatena os arquivos de um ano.
+
+    Returns:
+        tuple: (DataFrame, lista de avisos `(nível, mensagem)` para exibir)
+    """
+    all_data = []
+    problems = []
+    for file_path in year_file_paths(year, base_path).values():
+        try:
+            all_data.append(pd.read_csv(file_path, sep=";", encoding="latin1"))
+        except FileNotFoundError:
+            problems.append(("warning", f"Arquivo {file_path} não encontrado. Pulando..."))
+        except Exception as e:
+            problems.append(("error", f"Erro ao carregar {file_path}: {e}"))
+    df = pd.concat(all_data, ignore_index=True) if all_data else pd.DataFrame()
+    return df, problems
+
+def _to_float(series):
+    # Aceita vírgula decimal ("123,4"), como o `REPLACE` do backend DuckDB
+    if not pd.api.types.is_numeric_dtype(series):
+        series = series.astype(str).str.replace(",", ".")
+    return pd.to_numeric(series, errors="coerce")
+
+def prepare(df):
+    """Limpeza básica: nomes de colunas, datas, hora, numéricos e coordenadas."""
+    df = df.copy()
+    df.columns = df.columns.str.lower()
+    if "data_inversa" in df.columns:
+        df["data_inversa"] = pd.to_datetime(df["data_inversa"], errors="coerce")
+        df["ano"] = df["data_inversa"].dt.year
+        df["mes"] = df["data_inversa"].dt.month
+        df["dia_semana_num"] = df["data_inversa"].dt.dayofweek
+    if "horario" in df.columns:
+        df["hora"] = pd.to_datetime(df["horario"], format="%H:%M:%S", errors="coerce").dt.hour
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = _to_float(df[col]).fillna(0)
+    if "latitude" in df.columns and "longitude" in df.columns:
+        df["latitude"] = _to_float(df["latitude"])
+        df["longitude"] = _to_float(df["longitude"])
+    return df
+
+def load_prepared_year(year, base_path=UPLOAD_DIR):
+    """Lê e limpa os dados de um ano. Retorna `(DataFrame, avisos)`."""
+    df, problems = read_year(year, base_path)
+    return (prepare(df) if not df.empty else df), problems
+
+def compute_aggregates(df):
+    """Tabelas agregadas usadas pelos gráficos do dashboard."""
+    aggregates = {}
+    if "uf" in df.columns and "tipo_acidente" in df.columns:
+        aggregates["heatmap"] = df.groupby(["uf", "tipo_acidente"]).size().unstack(fill_value=0)
+    if "hora" in df.columns:
+        aggregates["risk_by_hour"] = df.groupby("hora").size().reset_index(name="acidentes")
+    if "causa_acidente" in df.columns:
+        aggregates["top_causes"] = df["causa_acidente"].value_counts().head(10)
+    if "dia_semana" in df.columns:
+        aggregates["day_counts"] = df["dia_semana"].value_counts()
+    if "condicao_metereologica" in df.columns:
+        aggregates["weather_counts"] = df["condicao_metereologica"].value_counts().head(8)
+    return aggregates
+
+def density_bins(df, decimals=MAP_BIN_DECIMALS):
+    """
+    Agrupa as coordenadas em células de `decimals` casas decimais (0,01° ≈ 1 km).
+
+    Retorna uma linha por célula com a contagem (`risco`) e a UF, BR e km
+    mais frequentes (no empate, o menor valor), em vez de um ponto por acidente.
+    """
+    if "latitude" not in df.columns or "longitude" not in df.columns:
+        return pd.DataFrame(columns=["latitude", "longitude", "risco"])
+    keys = ["latitude", "longitude"]
+    extra = [col for col in ("uf", "br", "km") if col in df.columns]
+    cells = pd.concat([df[keys].round(decimals), df[extra]], axis=1).dropna(subset=keys)
+    bins = cells.groupby(keys).size().rename("risco").reset_index()
+    for col in extra:
+        counts = cells.groupby(keys + [col]).size().rename("n").reset_index()
+        most_frequent = counts.sort_values(["n", col], ascending=[False, True], kind="stable") \
+            .drop_duplicates(keys, keep="first")
+        bins = bins.merge(most_frequent[keys + [col]], on=keys, how="left")
+    return bins
+
+def load_year_bundle(year, base_path=UPLOAD_DIR, cache=None, progress=None):
+    """
+    Dados preparados, agregados e células do mapa de um ano, via cache em disco.
+
+    `progress(fração, mensagem)`, se informado, é chamado entre as etapas
+    (ver `jobs.JobManager`).
+
+    Returns:
+        tuple: (DataFrame, agregados, células do mapa, avisos)
+    """
+    progress = progress or (lambda fraction, message: None)
+    cache = cache or get_cache()
+    sources = list(year_file_paths(year, base_path).values())
+    progress(0.0, f"Lendo arquivos de {year}")
+    # Erros de leitura podem ser transitórios: esse resultado não vai para o cache
+    df, problems = cache.get_or_compute(
+        "prepared", lambda: load_prepared_year(year, base_path), sources, (year,),
+        cacheable=lambda result: not any(level == "error" for level, _ in result[1]))
+    if df.empty:
+        return df, {}, pd.DataFrame(), problems
+    progress(0.6, "Calculando agregados")
+    aggregates = cache.get_or_compute(
+        "aggregates", lambda: compute_aggregates(df), sources, (year,))
+    progress(0.8, "Montando o mapa de densidade")
+    bins = cache.get_or_compute(
+        "map_bins", lambda: density_bins(df), sources, (year, MAP_BIN_DECIMALS))
+    progress(1.0, "Concluído")
+    return df, aggregates, bins, problems
+
+def summarize_year(year, base_path=UPLOAD_DIR, progress=None):
+    """
+    Resumo de um ano para o dashboard, no mesmo formato de `query_backend.summarize_years`.
+
+    Roda no `jobs.JobManager`: o DataFrame completo fica no processo filho
+    (e no cache em disco), e só o resumo volta para o servidor.
+
+    Returns:
+        tuple: (total de registros, colunas, agregados, células do mapa, avisos)
+    """
+    df, aggregates, bins, problems = load_year_bundle(year, base_path, progress=progress)
+    return len(df), set(df.columns), aggregates, bins, problems
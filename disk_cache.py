@@ -0,0 +1,242 @@
+"""
+Cache em disco, compartilhado entre processos, para dados derivados.
+
+Cada entrada é endereçada por um hash de (namespace, impressão digital dos
+arquivos de origem, versão do código, parâmetros). Assim, réplicas que
+apontam para o mesmo diretório reaproveitam o trabalho umas das outras e
+um reinício já começa aquecido. Entradas antigas são removidas por LRU
+quando o diretório passa de `max_bytes`.
+"""
+
+import os
+import pickle
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+CACHE_DIR = os.getenv("ACIDENTES_CACHE_DIR", os.path.join("upload", ".cache"))
+CACHE_MAX_BYTES = int(float(os.getenv("ACIDENTES_CACHE_MAX_MB", 2048)) * 1024 * 1024)
+HASH_BLOCK_BYTES = 1 << 20
+# Arquivos .lock sem entrada correspondente são removidos depois deste tempo
+LOCK_MAX_AGE_SECONDS = 24 * 3600
+
+_CODE_FILES = ("dataset.py", "disk_cache.py", "query_backend.py", "spatial_index.py", "timeseries.py")
+
+def code_version():
+    """Hash do código que gera os dados em cache (ou `ACIDENTES_CODE_VERSION`, se definido)."""
+    override = os.getenv("ACIDENTES_CODE_VERSION")
+    if override:
+        return override
+    digest = hashlib.sha256()
+    base = os.path.dirname(os.path.abspath(__file__))
+    for name in _CODE_FILES:
+        try:
+            with open(os.path.join(base, name), "rb") as f:
+                digest.update(f.read())
+        except FileNotFoundError:
+            pass
+    return digest.hexdigest()[:16]
+
+CODE_VERSION = code_version()
+
+_fingerprints = {}
+_fingerprints_lock = threading.Lock()
+
+def fingerprint(path):
+    """
+    Impressão digital de um arquivo de origem: nome, tamanho e hash do conteúdo.
+
+    Não depende da data de modificação, então réplicas com cópias próprias
+    dos mesmos CSVs chegam às mesmas chaves. A data de modificação só serve
+    de atalho local: enquanto (tamanho, mtime) não mudam, o hash já
+    calculado pelo processo é reaproveitado sem reler o arquivo.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return (os.path.basename(path), None)
+    stamp = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _fingerprints_lock:
+        digest = _fingerprints.get(stamp)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+                sha.update(block)
+        digest = sha.hexdigest()
+        with _fingerprints_lock:
+            _fingerprints[stamp] = digest
+    return (os.path.basename(path), stat.st_size, digest)
+
+class DiskCache:
+    """Cache em disco endereçado por conteúdo, com escrita atômica e evicção LRU."""
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, version=CODE_VERSION):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.version = version
+        self._evict_lock = threading.Lock()
+
+    def key(self, namespace, sources=(), params=()):
+        """Chave da entrada: hash do namespace, das origens, da versão do código e dos parâmetros."""
+        material = repr((namespace, [fingerprint(p) for p in sources], self.version, tuple(params)))
+        return f"{namespace}-{hashlib.sha256(material.encode('utf-8')).hexdigest()}"
+
+    def _path(self, key):
+        return os.path.join(self.root, key[-2:], f"{key}.pkl")
+
+    def get(self, key):
+        """Retorna `(True, valor)` se a entrada existir, ou `(False, None)`."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return False, None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # Entrada corrompida ou de outra versão de biblioteca: descarta
+            self._remove(path)
+            return False, None
+        try:
+            os.utime(path)  # Marca o uso recente para o LRU
+        except OSError:
+            pass
+        return True, value
+
+    def set(self, key, value):
+        """Grava a entrada de forma atômica (arquivo temporário + `os.replace`)."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        finally:
+            self._remove(tmp_path)
+        self.evict()
+
+    def get_or_compute(self, namespace, compute, sources=(), params=(), cacheable=None):
+        """
+        Retorna a entrada em cache ou calcula, grava e retorna `compute()`.
+
+        Um lock de arquivo por chave garante que, entre processos e réplicas,
+        só um calcule a mesma entrada; os demais esperam e leem o resultado.
+        Se `cacheable(valor)` retornar False, o valor é devolvido sem ser
+        gravado (ex.: resultado de uma falha transitória de leitura).
+        """
+        key = self.key(namespace, sources, params)
+        hit, value = self.get(key)
+        if hit:
+            return value
+        with self._key_lock(key):
+            hit, value = self.get(key)
+            if hit:
+                return value
+            value = compute()
+            if cacheable is None or cacheable(value):
+                self.set(key, value)
+        return value
+
+    @contextmanager
+    def _key_lock(self, key):
+        lock_path = f"{self._path(key)}.lock"
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        with open(lock_path, "a+b") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _entries(self, suffix=".pkl"):
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(suffix):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def size(self):
+        """Total de bytes ocupados pelas entradas."""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """
+        Remove as entradas usadas há mais tempo até caber em `max_bytes`.
+
+        Os locks das entradas removidas vão junto, assim como locks antigos
+        de entradas que nunca foram gravadas.
+        """
+        with self._evict_lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                self._remove(f"{path}.lock")
+                total -= size
+            self._remove_stale_locks()
+
+    def _remove_stale_locks(self, max_age=LOCK_MAX_AGE_SECONDS):
+        now = time.time()
+        for mtime, _, lock_path in self._entries(".lock"):
+            if now - mtime > max_age and not os.path.exists(lock_path[:-len(".lock")]):
+                self._remove(lock_path)
+
+    def clear(self):
+        """Remove todas as entradas e seus locks."""
+        for _, _, path in self._entries():
+            self._remove(path)
+        for _, _, path in self._entries(".lock"):
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Retorna o cache em disco compartilhado pelo processo."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DiskCache()
+    return _cache
+
+if __name__ == "__main__":
+    cache = get_cache()
+    print(f"📦 {cache.root}: {cache.size() / 1024 / 1024:.1f} MB (limite {cache.max_bytes / 1024 / 1024:.0f} MB)")
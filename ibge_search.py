@@ -0,0 +1,176 @@
+"""
+Busca semântica no catálogo de agregados do IBGE.
+
+Os embeddings de cada linha `Agregado`/`Descrição` são gerados uma única vez
+(modelo local via Ollama ou, na falta dele, um hashing determinístico) e
+salvos como uma matriz NumPy compacta. As consultas são um produto matricial
+seguido de top-k, o que leva milissegundos mesmo para o catálogo inteiro.
+"""
+
+import os
+import re
+import zlib
+import hashlib
+import unicodedata
+import numpy as np
+import pandas as pd
+
+CATALOG_PATH = os.path.join("upload", "ibge_agregados_list.csv")
+INDEX_PATH = os.path.join("upload", "ibge_agregados_embeddings.npz")
+EMBED_MODEL = os.getenv("IBGE_EMBED_MODEL", "nomic-embed-text")
+EMBED_BATCH = int(os.getenv("IBGE_EMBED_BATCH", 64))
+HASHING_MODEL = "hashing"
+HASHING_DIM = 512
+
+_TOKEN_RE = re.compile(r"\w+")
+
+def load_catalog(path=CATALOG_PATH):
+    """Carrega o catálogo de agregados gerado pelo `ibge_pipeline`."""
+    df = pd.read_csv(path, sep=";", encoding="utf-8-sig", dtype=str).fillna("")
+    return df.reset_index(drop=True)
+
+def catalog_texts(df):
+    """Monta o texto de cada linha a partir das colunas `Agregado` e `Descrição`."""
+    return (df["Agregado"] + ": " + df["Descrição"]).tolist()
+
+def file_fingerprint(path):
+    """Identifica a versão do catálogo pelo conteúdo do arquivo."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _normalize_text(text):
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+def hashing_embed(texts, dim=HASHING_DIM):
+    """
+    Embedding determinístico por hashing de palavras e trigramas de caracteres.
+
+    Não depende de serviço externo e gera sempre os mesmos vetores, por isso é
+    usado como alternativa ao Ollama (e em testes).
+    """
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in _TOKEN_RE.findall(_normalize_text(text)):
+            features = [word]
+            padded = f"#{word}#"
+            features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+            for feature in features:
+                h = zlib.crc32(feature.encode("utf-8"))
+                matrix[row, h % dim] += 1.0 if (h >> 31) & 1 else -1.0
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+def ollama_embed(texts, model=EMBED_MODEL, batch_size=EMBED_BATCH):
+    """Gera embeddings normalizados com um modelo local servido pelo Ollama."""
+    import ollama
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        response = ollama.embed(model=model, input=texts[start:start + batch_size])
+        vectors.extend(response["embeddings"])
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+def embed(texts, model):
+    """Gera embeddings com o modelo indicado (`HASHING_MODEL` ou um modelo do Ollama)."""
+    if model == HASHING_MODEL:
+        return hashing_embed(texts)
+    return ollama_embed(texts, model)
+
+def model_available(model):
+    """Indica se o modelo responde (um embedding de teste no Ollama)."""
+    if model == HASHING_MODEL:
+        return True
+    try:
+        ollama_embed(["teste"], model)
+        return True
+    except Exception:
+        return False
+
+def build_index(catalog_path=CATALOG_PATH, index_path=INDEX_PATH, model=EMBED_MODEL):
+    """
+    Gera e salva os embeddings do catálogo.
+
+    Tenta o modelo do Ollama e, se o serviço não estiver disponível, usa o
+    hashing determinístico. A matriz é salva em float16 para ocupar metade
+    do espaço.
+    """
+    df = load_catalog(catalog_path)
+    texts = catalog_texts(df)
+    try:
+        matrix = embed(texts, model)
+    except Exception as e:
+        print(f"Ollama indisponível para embeddings ({e}). Usando hashing determinístico.")
+        model = HASHING_MODEL
+        matrix = hashing_embed(texts)
+    # Escrita atômica: outro processo pode estar lendo o mesmo arquivo
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                embeddings=matrix.astype(np.float16),
+                model=np.array(model),
+                fingerprint=np.array(file_fingerprint(catalog_path)),
+            )
+        os.replace(tmp_path, index_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return load_index(index_path)
+
+def load_index(index_path=INDEX_PATH):
+    """Carrega o índice salvo por `build_index`."""
+    with np.load(index_path) as data:
+        return {
+            "embeddings": data["embeddings"].astype(np.float32),
+            "model": str(data["model"]),
+            "fingerprint": str(data["fingerprint"]),
+        }
+
+def load_or_build_index(catalog_path=CATALOG_PATH, index_path=INDEX_PATH, model=EMBED_MODEL):
+    """
+    Reaproveita o índice salvo enquanto o catálogo e o modelo não mudarem.
+
+    Um índice montado com outro modelo é reconstruído. O montado com o
+    hashing (Ollama fora do ar) continua valendo enquanto o modelo pedido
+    não responder; quando ele voltar, o índice é refeito com ele.
+    """
+    if os.path.exists(index_path):
+        index = load_index(index_path)
+        if index["fingerprint"] == file_fingerprint(catalog_path):
+            if index["model"] == model:
+                return index
+            if index["model"] == HASHING_MODEL and not model_available(model):
+                return index
+    return build_index(catalog_path, index_path, model)
+
+def search(query, index, catalog, k=10):
+    """
+    Retorna as `k` linhas do catálogo mais próximas da consulta.
+
+    Args:
+        query (str): Texto livre da consulta
+        index (dict): Índice retornado por `load_or_build_index`
+        catalog (pd.DataFrame): Catálogo na mesma ordem usada no índice
+        k (int): Quantidade de resultados
+
+    Returns:
+        pd.DataFrame: Linhas do catálogo com a coluna `similaridade`
+    """
+    embeddings = index["embeddings"]
+    k = min(k, len(embeddings))
+    if not query.strip() or k == 0:
+        return catalog.iloc[:0].assign(similaridade=pd.Series(dtype="float32"))
+    scores = embeddings @ embed([query], index["model"])[0]
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return catalog.iloc[top].assign(similaridade=scores[top])
+
+if __name__ == "__main__":
+    index = build_index()
+    print(f"✅ Índice salvo em {INDEX_PATH}: {index['embeddings'].shape} ({index['model']})")
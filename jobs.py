@@ -0,0 +1,238 @@
+"""
+Execução de tarefas pesadas em segundo plano.
+
+As tarefas rodam em um pool de processos, fora da thread do Streamlit.
+Pedidos idênticos (mesma chave) compartilham a mesma execução
+("single-flight"): se dez sessões pedem o mesmo ano ao mesmo tempo, ele é
+carregado uma única vez. As tarefas informam o progresso e podem ser
+canceladas entre uma etapa e outra, quando a última sessão à espera desiste.
+"""
+
+import os
+import sys
+import uuid
+import types
+import threading
+import multiprocessing
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+from concurrent.futures.process import BrokenProcessPool
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# Resultados concluídos mantidos em memória; os demais voltam do cache em disco
+JOB_RESULT_CACHE_SIZE = int(os.getenv("JOB_RESULT_CACHE_SIZE", 4))
+
+class JobCancelled(Exception):
+    """A tarefa foi cancelada a pedido do usuário."""
+
+class JobContext:
+    """Leva ao processo filho o progresso e o cancelamento de um job; a tarefa recebe `report` como `progress`."""
+
+    def __init__(self, job_id, progress, cancelled):
+        self.job_id = job_id
+        self._progress = progress
+        self._cancelled = cancelled
+
+    def report(self, fraction, message=""):
+        """Atualiza o progresso (0 a 1) e interrompe a tarefa se ela foi cancelada."""
+        self.check_cancelled()
+        self._progress[self.job_id] = (float(fraction), message)
+
+    def check_cancelled(self):
+        if self.job_id in self._cancelled:
+            raise JobCancelled(self.job_id)
+
+@contextmanager
+def _neutral_main():
+    """
+    Troca temporariamente o `__main__` por um módulo vazio.
+
+    O Streamlit registra o script do dashboard como `__main__`, e o "spawn"
+    reexecutaria o script inteiro em cada processo filho.
+    """
+    original = sys.modules["__main__"]
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = original
+
+def _run_job(fn, context, args, kwargs):
+    return fn(*args, progress=context.report, **kwargs)
+
+def _wait_started(started):
+    # Segura o worker até todos terem subido, para nenhum ficar ocioso antes da hora
+    started.wait()
+    return os.getpid()
+
+def _source_stamp(sources):
+    stamp = []
+    for path in sources:
+        try:
+            stat = os.stat(path)
+            stamp.append((path, stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            stamp.append((path, None, None))
+    return tuple(stamp)
+
+class Job:
+    """Uma execução em andamento ou concluída, compartilhada por todos que pediram a mesma chave."""
+
+    def __init__(self, manager, key, future, job_id, stamp=()):
+        self.key = key
+        self.id = job_id
+        self.stamp = stamp
+        self._manager = manager
+        self._future = future
+        self._waiters = 0
+
+    def done(self):
+        return self._future.done()
+
+    def failed(self):
+        """Concluída com erro ou cancelada."""
+        if not self._future.done():
+            return False
+        return self._future.cancelled() or self._future.exception() is not None
+
+    def progress(self):
+        """Retorna `(fração, mensagem)` da última etapa informada pela tarefa."""
+        if self._future.done() and not self.failed():
+            return 1.0, "Concluído"
+        return self._manager._progress.get(self.id, (0.0, "Na fila"))
+
+    def result(self, timeout=None):
+        """Aguarda e retorna o resultado. Levanta `JobCancelled` se a tarefa foi cancelada."""
+        try:
+            return self._future.result(timeout)
+        except CancelledError:
+            raise JobCancelled(self.id)
+
+class JobManager:
+    """
+    Pool de processos com deduplicação por chave.
+
+    `submit` retorna o `Job` já existente para a chave enquanto ele estiver
+    em andamento ou tiver terminado com sucesso, funcionando também como
+    cache em memória do resultado: os `max_results` usados mais
+    recentemente ficam guardados, enquanto os arquivos de origem não
+    mudarem. Jobs com erro ou cancelados são substituídos no próximo pedido.
+
+    Cada `submit` conta a sessão como interessada no job até o `detach`
+    correspondente; um pedido de cancelamento só interrompe a tarefa quando
+    nenhuma outra sessão está esperando por ela.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_results=JOB_RESULT_CACHE_SIZE):
+        # "spawn" evita fork de um servidor com várias threads
+        self._context = multiprocessing.get_context("spawn")
+        self._workers = workers
+        self._max_results = max_results
+        with _neutral_main():
+            self._shared = self._context.Manager()
+        self._progress = self._shared.dict()
+        self._cancelled = self._shared.dict()
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = self._start_executor()
+
+    def _start_executor(self):
+        executor = ProcessPoolExecutor(max_workers=self._workers, mp_context=self._context)
+        # O pool sobe os processos sob demanda, um a cada submit que não
+        # encontra worker ocioso, e cada um importa o `__main__` da hora.
+        # Sobe todos já, com o __main__ neutro: as tarefas só terminam depois
+        # do último submit, então nenhum worker fica ocioso no meio do caminho.
+        started = self._shared.Event()
+        with _neutral_main():
+            futures = [executor.submit(_wait_started, started) for _ in range(self._workers)]
+        started.set()
+        for future in futures:
+            future.result()
+        return executor
+
+    def submit(self, key, fn, *args, sources=(), **kwargs):
+        """
+        Agenda `fn(*args, progress=callback, **kwargs)` ou reaproveita o job da mesma chave.
+
+        `fn` precisa ser uma função de módulo (serializável) e aceitar o
+        argumento `progress(fração, mensagem)`. Um resultado guardado só é
+        reaproveitado se os arquivos em `sources` não mudaram (tamanho e
+        data de modificação). Quem chama deve chamar `detach(job)` ao
+        deixar de esperar.
+        """
+        stamp = _source_stamp(sources)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not job.failed() and (not job.done() or job.stamp == stamp):
+                self._jobs.move_to_end(key)
+                job._waiters += 1
+                return job
+            job_id = uuid.uuid4().hex
+            context = JobContext(job_id, self._progress, self._cancelled)
+            try:
+                future = self._executor.submit(_run_job, fn, context, args, kwargs)
+            except BrokenProcessPool:
+                # Um processo morreu (ex.: falta de memória); recria o pool
+                self._executor = self._start_executor()
+                future = self._executor.submit(_run_job, fn, context, args, kwargs)
+            job = Job(self, key, future, job_id, stamp)
+            job._waiters = 1
+            future.add_done_callback(lambda _f, job_id=job_id: self._cleanup(job_id))
+            self._jobs[key] = job
+            self._jobs.move_to_end(key)
+            self._evict()
+            return job
+
+    def _evict(self):
+        done = [key for key, job in self._jobs.items() if job.done()]
+        for key in done[:max(0, len(done) - self._max_results)]:
+            del self._jobs[key]
+
+    def detach(self, job, cancel=False):
+        """
+        A sessão deixa de esperar o job.
+
+        Com `cancel=True`, a tarefa é cancelada se nenhuma outra sessão
+        continua esperando por ela. Retorna True se ela foi cancelada.
+        """
+        with self._lock:
+            job._waiters = max(0, job._waiters - 1)
+            last = job._waiters == 0
+        return cancel and last and self._cancel(job)
+
+    def get(self, key):
+        """Retorna o job da chave, se houver."""
+        with self._lock:
+            return self._jobs.get(key)
+
+    def cancel(self, key):
+        """Cancela o job da chave para todas as sessões."""
+        with self._lock:
+            job = self._jobs.get(key)
+        return job is not None and self._cancel(job)
+
+    def _cancel(self, job):
+        # Se ainda está na fila, não roda; se está rodando, para na próxima etapa
+        if job.done():
+            return False
+        if not job._future.cancel():
+            self._cancelled[job.id] = True
+        return True
+
+    def forget(self, key):
+        """Descarta o resultado guardado da chave, para que o próximo pedido recalcule."""
+        with self._lock:
+            self._jobs.pop(key, None)
+
+    def _cleanup(self, job_id):
+        try:
+            self._progress.pop(job_id, None)
+            self._cancelled.pop(job_id, None)
+        except (OSError, EOFError, BrokenPipeError):
+            # O Manager já foi encerrado (desligamento do processo)
+            pass
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._shared.shutdown()
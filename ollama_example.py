@@ -6,13 +6,86 @@ Este script demonstra como usar a LLM para análise de dados de acidentes
 
 import ollama
 import pandas as pd
+import numpy as np
 import json
+import os
 
-def load_sample_data():
-    """Carrega dados de exemplo para demonstração"""
+DATA_PATH = os.getenv("DATATRAN_PATH", os.path.join("upload", "datatran2023.csv"))
+CHUNK_SIZE = int(os.getenv("DATATRAN_CHUNK_SIZE", 50000))
+SAMPLE_SIZE = int(os.getenv("DATATRAN_SAMPLE_SIZE", 100))
+
+SUMMARY_COLUMNS = {
+    "principais_causas": ("causa_acidente", 5),
+    "ufs_com_mais_acidentes": ("uf", 5),
+    "tipos_acidente": ("tipo_acidente", None),
+    "condicoes_meteorologicas": ("condicao_metereologica", None),
+}
+
+def stream_data_summary(path=DATA_PATH, chunksize=CHUNK_SIZE, sample_size=SAMPLE_SIZE, seed=None):
+    """
+    Percorre o CSV em blocos, numa única passada e com memória constante.
+
+    Acumula as contagens usadas por `generate_data_summary` e mantém uma
+    amostra por reservatório (algoritmo R) de `sample_size` linhas,
+    uniformemente distribuída sobre o arquivo inteiro.
+
+    Returns:
+        tuple: (dicionário de estatísticas, DataFrame com a amostra)
+    """
+    rng = np.random.default_rng(seed)
+    counts = {key: pd.Series(dtype="int64") for key in SUMMARY_COLUMNS}
+    total = 0
+    data_min = data_max = None
+    reservoir = None
+
+    reader = pd.read_csv(path, sep=';', encoding='latin1', chunksize=chunksize, low_memory=False)
+    for chunk in reader:
+        for key, (col, _) in SUMMARY_COLUMNS.items():
+            if col in chunk.columns:
+                counts[key] = counts[key].add(chunk[col].value_counts(), fill_value=0)
+
+        if 'data_inversa' in chunk.columns:
+            datas = pd.to_datetime(chunk['data_inversa'], errors='coerce').dropna()
+            if not datas.empty:
+                data_min = datas.min() if data_min is None else min(data_min, datas.min())
+                data_max = datas.max() if data_max is None else max(data_max, datas.max())
+
+        n = len(chunk)
+        if sample_size > 0:
+            if reservoir is None:
+                reservoir = chunk.iloc[:0].copy()
+            # Preenche o reservatório com as primeiras linhas
+            fill = max(0, min(sample_size - len(reservoir), n))
+            if fill:
+                reservoir = pd.concat([reservoir, chunk.iloc[:fill]], ignore_index=True)
+            # Substituições: a linha de índice global i entra com probabilidade k/(i+1)
+            if fill < n:
+                global_idx = np.arange(total + fill, total + n)
+                slots = (rng.random(len(global_idx)) * (global_idx + 1)).astype(np.int64)
+                hit = slots < sample_size
+                if hit.any():
+                    # Em colisões prevalece a última linha, como na versão sequencial
+                    slot_to_row = pd.Series(np.nonzero(hit)[0] + fill, index=slots[hit])
+                    slot_to_row = slot_to_row[~slot_to_row.index.duplicated(keep='last')]
+                    novas = chunk.iloc[slot_to_row.to_numpy()].set_axis(slot_to_row.index)
+                    reservoir = pd.concat([reservoir.drop(index=novas.index), novas]).sort_index()
+        total += n
+
+    stats = {"total_registros": total}
+    if data_min is not None:
+        stats["periodo"] = f"{data_min:%d/%m/%Y} a {data_max:%d/%m/%Y}"
+    for key, (_, top) in SUMMARY_COLUMNS.items():
+        serie = counts[key].astype("int64").sort_values(ascending=False)
+        stats[key] = (serie.head(top) if top else serie).to_dict()
+
+    sample = reservoir if reservoir is not None else pd.DataFrame()
+    return stats, sample
+
+def load_sample_data(path=DATA_PATH, sample_size=SAMPLE_SIZE):
+    """Carrega uma amostra representativa (reservatório) do arquivo completo"""
     try:
-        df = pd.read_csv('/home/ubuntu/upload/datatran2023.csv', sep=';', encoding='latin1')
-        return df.head(100)  # Amostra pequena para exemplo
+        _, sample = stream_data_summary(path, sample_size=sample_size)
+        return sample
     except Exception as e:
         print(f"Erro ao carregar dados: {e}")
         return pd.DataFrame()
@@ -56,14 +129,14 @@ def analyze_with_llm(data_summary, question):
     except Exception as e:
         return f"Erro ao conectar com Ollama: {e}"
 
-def generate_data_summary(df):
+def generate_data_summary(df, periodo="2023 (amostra)"):
     """Gera um resumo dos dados para a LLM"""
     if df.empty:
         return "Nenhum dado disponível"
     
     summary = {
         "total_registros": len(df),
-        "periodo": "2023 (amostra)",
+        "periodo": periodo,
         "principais_causas": df['causa_acidente'].value_counts().head(5).to_dict() if 'causa_acidente' in df.columns else {},
         "ufs_com_mais_acidentes": df['uf'].value_counts().head(5).to_dict() if 'uf' in df.columns else {},
         "tipos_acidente": df['tipo_acidente'].value_counts().to_dict() if 'tipo_acidente' in df.columns else {},
@@ -72,22 +145,32 @@ def generate_data_summary(df):
     
     return json.dumps(summary, indent=2, ensure_ascii=False)
 
+def generate_file_summary(path=DATA_PATH, chunksize=CHUNK_SIZE):
+    """Gera o mesmo resumo de `generate_data_summary` sobre o arquivo inteiro, em blocos"""
+    try:
+        stats, _ = stream_data_summary(path, chunksize=chunksize, sample_size=0)
+    except Exception as e:
+        print(f"Erro ao carregar dados: {e}")
+        return None
+    if not stats["total_registros"]:
+        return "Nenhum dado disponível"
+    stats.setdefault("periodo", "desconhecido")
+    return json.dumps(stats, indent=2, ensure_ascii=False)
+
 def main():
     """Função principal do exemplo"""
     print("🚗 Exemplo de Análise de Acidentes com Llama 3.1")
     print("=" * 50)
     
     # Carregar dados
-    print("📊 Carregando dados...")
-    df = load_sample_data()
+    print(f"📊 Resumindo dados de {DATA_PATH}...")
+    data_summary = generate_file_summary()
     
-    if df.empty:
+    if data_summary is None:
         print("❌ Não foi possível carregar os dados.")
         return
     
-    # Gerar resumo dos dados
-    data_summary = generate_data_summary(df)
-    print(f"✅ Dados carregados: {len(df)} registros")
+    print("✅ Arquivo completo resumido")
     print("\n📋 Resumo dos dados:")
     print(data_summary)
     
@@ -116,13 +199,11 @@ def interactive_mode():
     print("\n🔄 Modo Interativo")
     print("Digite suas perguntas (ou 'sair' para terminar):")
     
-    df = load_sample_data()
-    if df.empty:
+    data_summary = generate_file_summary()
+    if data_summary is None:
         print("❌ Não foi possível carregar os dados.")
         return
     
-    data_summary = generate_data_summary(df)
-    
     while True:
         question = input("\n❓ Sua pergunta: ").strip()
         
@@ -13,7 +13,9 @@ from core.auth import (
     get_user_by_email,
     is_login_attempts_exceeded,
     check_session_expiry,
-    logout_user
+    logout_user,
+    PasswordPoolBusy,
+    LoginThrottled
 )
 
 st.set_page_config(
@@ -53,7 +55,13 @@ def show_login_form():
             st.error("Número máximo de tentativas de login excedido. Tente novamente mais tarde.")
             return
         
-        if authenticate_email_password(email, password):
+        try:
+            authenticated = authenticate_email_password(email, password)
+        except (LoginThrottled, PasswordPoolBusy) as e:
+            st.warning(str(e))
+            return
+
+        if authenticated:
             st.success("Login realizado com sucesso!")
             st.switch_page("app_optimized.py") # Redireciona para o script principal
         else:
@@ -99,7 +107,13 @@ def show_register_form():
             st.error("Este e-mail já está em uso.")
             return
 
-        if register_user(email, password, name):
+        try:
+            registered = register_user(email, password, name)
+        except PasswordPoolBusy as e:
+            st.warning(str(e))
+            return
+
+        if registered:
             st.success("Conta criada com sucesso! Faça login para continuar.")
             st.session_state.show_register = False
             st.rerun()
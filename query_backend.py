@@ -0,0 +1,253 @@
+"""
+Backends de consulta para as agregações do dashboard.
+
+- `PandasBackend`: opera sobre o DataFrame do ano já carregado (padrão).
+- `DuckDBBackend`: consulta os CSVs direto do disco com o DuckDB, empurrando
+  filtros e agrupamentos para o motor colunar. Usa todos os núcleos e
+  memória limitada (com spill para disco), permitindo analisar vários anos
+  que não cabem na RAM.
+
+Os dois expõem a mesma interface (`columns`, `count`, `count_by`, `select`,
+`density_bins`), e `compute_aggregates` monta as tabelas dos gráficos a
+partir de qualquer um deles. Escolha com `QUERY_BACKEND=pandas|duckdb`.
+"""
+
+import os
+import pandas as pd
+import dataset
+
+QUERY_BACKEND = os.getenv("QUERY_BACKEND", "pandas")
+DUCKDB_MEMORY_LIMIT = os.getenv("DUCKDB_MEMORY_LIMIT", "2GB")
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS", os.cpu_count() or 1))
+DUCKDB_TEMP_DIR = os.getenv("DUCKDB_TEMP_DIR", os.path.join("upload", ".cache", "duckdb"))
+
+def _where_pandas(df, where):
+    mask = pd.Series(True, index=df.index)
+    for col, value in (where or {}).items():
+        if isinstance(value, (list, tuple, set)):
+            mask &= df[col].isin(list(value))
+        else:
+            mask &= df[col] == value
+    return df[mask]
+
+class PandasBackend:
+    """Backend em memória sobre um DataFrame preparado por `dataset.prepare`."""
+
+    def __init__(self, df):
+        self.df = df
+
+    def columns(self):
+        return set(self.df.columns)
+
+    def count(self, where=None):
+        return len(_where_pandas(self.df, where))
+
+    def count_by(self, by, where=None, order_desc=False, limit=None):
+        """Contagem de linhas por grupo, na coluna `n` (valores nulos formam um grupo, como no SQL)."""
+        counts = _where_pandas(self.df, where).groupby(list(by), dropna=False).size().rename("n").reset_index()
+        if order_desc:
+            counts = counts.sort_values("n", ascending=False, kind="stable")
+        return counts.head(limit) if limit else counts
+
+    def select(self, columns, where=None):
+        """Colunas selecionadas das linhas que atendem ao filtro."""
+        return _where_pandas(self.df, where)[list(columns)].reset_index(drop=True)
+
+    def density_bins(self, decimals=dataset.MAP_BIN_DECIMALS):
+        return dataset.density_bins(self.df, decimals)
+
+class DuckDBBackend:
+    """
+    Backend colunar sobre os CSVs em disco.
+
+    Monta uma view `acidentes` com as mesmas colunas derivadas de
+    `dataset.prepare` (`data_inversa` como data, `hora`, `ano`, `mes`,
+    `dia_semana_num`, coordenadas e km numéricos) e executa filtros e
+    agrupamentos dentro do DuckDB.
+    """
+
+    def __init__(self, paths, memory_limit=DUCKDB_MEMORY_LIMIT, threads=DUCKDB_THREADS,
+                 temp_dir=DUCKDB_TEMP_DIR):
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError("QUERY_BACKEND=duckdb requer o pacote `duckdb` (pip install duckdb)") from e
+        self.paths = [p for p in paths if os.path.exists(p)]
+        os.makedirs(temp_dir, exist_ok=True)
+        self.conn = duckdb.connect()
+        self.conn.execute(f"SET memory_limit = '{memory_limit}'")
+        self.conn.execute(f"SET threads = {int(threads)}")
+        self.conn.execute("SET temp_directory = ?", [temp_dir])
+        self._columns = set()
+        if self.paths:
+            self._create_view()
+
+    def _create_view(self):
+        paths = ", ".join("'" + p.replace("'", "''") + "'" for p in self.paths)
+        self.conn.execute(
+            f"CREATE VIEW _raw AS SELECT * FROM read_csv([{paths}], delim=';', header=true, "
+            "encoding='latin-1', all_varchar=true, union_by_name=true)"
+        )
+        raw = {row[0].lower(): row[0] for row in self.conn.execute("DESCRIBE _raw").fetchall()}
+        select = [f'"{original}" AS "{name}"' for name, original in raw.items()
+                  if name not in ("data_inversa", "latitude", "longitude", "br", *dataset.NUMERIC_COLUMNS)]
+        for col in ("latitude", "longitude", *dataset.NUMERIC_COLUMNS):
+            if col in raw:
+                value = f"TRY_CAST(REPLACE(\"{raw[col]}\", ',', '.') AS DOUBLE)"
+                select.append(f"{value if col in ('latitude', 'longitude') else f'COALESCE({value}, 0)'} AS {col}")
+        if "br" in raw:
+            select.append(f'TRY_CAST("{raw["br"]}" AS INTEGER) AS br')
+        if "data_inversa" in raw:
+            data = (f"COALESCE(TRY_STRPTIME(\"{raw['data_inversa']}\", '%Y-%m-%d'), "
+                    f"TRY_STRPTIME(\"{raw['data_inversa']}\", '%d/%m/%Y'))")
+            select.append(f"{data} AS data_inversa")
+            select.append(f"YEAR({data}) AS ano")
+            select.append(f"MONTH({data}) AS mes")
+            select.append(f"ISODOW({data}) - 1 AS dia_semana_num")
+        if "horario" in raw:
+            select.append(f"HOUR(TRY_STRPTIME(\"{raw['horario']}\", '%H:%M:%S')) AS hora")
+        self.conn.execute(
+            f"CREATE VIEW acidentes AS SELECT {', '.join(select)} FROM _raw"
+        )
+        self._columns = {row[0] for row in self._execute("DESCRIBE acidentes").fetchall()}
+
+    def columns(self):
+        return set(self._columns)
+
+    @staticmethod
+    def _where_sql(where):
+        clauses, params = [], []
+        for col, value in (where or {}).items():
+            if isinstance(value, (list, tuple, set)):
+                values = list(value)
+                clauses.append(f'"{col}" IN ({", ".join("?" * len(values))})')
+                params.extend(values)
+            else:
+                clauses.append(f'"{col}" = ?')
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def _execute(self, sql, params=()):
+        # Um cursor por consulta: a conexão é compartilhada entre sessões (threads)
+        return self.conn.cursor().execute(sql, list(params))
+
+    def _query(self, sql, params):
+        return self._execute(sql, params).df()
+
+    def count(self, where=None):
+        if not self._columns:
+            return 0
+        where_sql, params = self._where_sql(where)
+        return self._execute(f"SELECT COUNT(*) FROM acidentes{where_sql}", params).fetchone()[0]
+
+    def count_by(self, by, where=None, order_desc=False, limit=None):
+        """Contagem de linhas por grupo, na coluna `n`, calculada no DuckDB."""
+        cols = ", ".join(f'"{c}"' for c in by)
+        where_sql, params = self._where_sql(where)
+        sql = f"SELECT {cols}, COUNT(*) AS n FROM acidentes{where_sql} GROUP BY ALL"
+        sql += " ORDER BY n DESC" if order_desc else f" ORDER BY {cols}"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return self._query(sql, params)
+
+    def select(self, columns, where=None):
+        """Colunas selecionadas das linhas que atendem ao filtro."""
+        where_sql, params = self._where_sql(where)
+        cols = ", ".join(f'"{c}"' for c in columns)
+        return self._query(f"SELECT {cols} FROM acidentes{where_sql}", params)
+
+    def accident_points(self, columns):
+        """
+        Colunas de um ponto por acidente com coordenadas, filtradas e deduplicadas no DuckDB.
+
+        O arquivo `acidentes` repete o `id` do acidente em uma linha por
+        pessoa; fica uma linha por `id` (linhas sem `id` são mantidas).
+        """
+        cols = ", ".join(f'"{c}"' for c in columns)
+        sql = f"SELECT {cols} FROM acidentes WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+        if "id" in self._columns:
+            sql += (" QUALIFY TRY_CAST(id AS DOUBLE) IS NULL "
+                    "OR ROW_NUMBER() OVER (PARTITION BY TRY_CAST(id AS DOUBLE)) = 1")
+        return self._query(sql, [])
+
+    def density_bins(self, decimals=dataset.MAP_BIN_DECIMALS):
+        """Mesmo resultado de `dataset.density_bins`, agrupado no DuckDB."""
+        if not {"latitude", "longitude"} <= self._columns:
+            return pd.DataFrame(columns=["latitude", "longitude", "risco"])
+        extra = [c for c in ("uf", "br", "km") if c in self._columns]
+        # ROUND_EVEN arredonda os empates para o par, como o `round` do pandas
+        cells = (f"SELECT ROUND_EVEN(latitude, {int(decimals)}) AS latitude, ROUND_EVEN(longitude, {int(decimals)}) AS longitude"
+                 f"{''.join(f', {c}' for c in extra)} FROM acidentes "
+                 "WHERE latitude IS NOT NULL AND longitude IS NOT NULL")
+        # Valor mais frequente por célula; no empate, o menor (como em `dataset.density_bins`)
+        modes = "".join(
+            f" LEFT JOIN (SELECT latitude, longitude, {c} FROM (SELECT latitude, longitude, {c}, COUNT(*) AS n "
+            f"FROM cells WHERE {c} IS NOT NULL GROUP BY ALL) "
+            f"QUALIFY ROW_NUMBER() OVER (PARTITION BY latitude, longitude ORDER BY n DESC, {c}) = 1) "
+            f"AS mode_{c} USING (latitude, longitude)"
+            for c in extra
+        )
+        return self._query(
+            f"WITH cells AS ({cells}) SELECT latitude, longitude, risco{''.join(f', {c}' for c in extra)} "
+            f"FROM (SELECT latitude, longitude, COUNT(*) AS risco FROM cells GROUP BY 1, 2){modes}",
+            [],
+        )
+
+def get_backend(years, df=None, backend=QUERY_BACKEND):
+    """
+    Cria o backend configurado.
+
+    Args:
+        years (list): anos a consultar (usado pelo DuckDB)
+        df (pd.DataFrame): dados já carregados (usado pelo pandas)
+    """
+    if backend == "duckdb":
+        paths = [p for year in years for p in dataset.year_file_paths(year).values()]
+        return DuckDBBackend(paths)
+    if backend == "pandas":
+        return PandasBackend(df if df is not None else pd.DataFrame())
+    raise ValueError(f"QUERY_BACKEND inválido: {backend} (use 'pandas' ou 'duckdb')")
+
+def compute_aggregates(backend):
+    """Mesmas tabelas de `dataset.compute_aggregates`, calculadas pelo backend."""
+    columns = backend.columns()
+    aggregates = {}
+    if {"uf", "tipo_acidente"} <= columns:
+        counts = backend.count_by(["uf", "tipo_acidente"]).dropna()
+        aggregates["heatmap"] = counts.pivot(index="uf", columns="tipo_acidente", values="n").fillna(0).astype(int)
+    if "hora" in columns:
+        counts = backend.count_by(["hora"]).dropna(subset=["hora"])
+        aggregates["risk_by_hour"] = counts.rename(columns={"n": "acidentes"})
+    for key, col, limit in (("top_causes", "causa_acidente", 10), ("day_counts", "dia_semana", None),
+                            ("weather_counts", "condicao_metereologica", 8)):
+        if col in columns:
+            counts = backend.count_by([col], order_desc=True, limit=limit).dropna(subset=[col])
+            aggregates[key] = counts.set_index(col)["n"].rename("count")
+    return aggregates
+
+def summarize_years(years, progress=None):
+    """
+    Total, colunas, agregados e células do mapa de vários anos via DuckDB.
+
+    Pensada para rodar no `jobs.JobManager`; os resultados ficam no cache em
+    disco, chaveados pelos arquivos de origem.
+    """
+    from disk_cache import get_cache
+    progress = progress or (lambda fraction, message: None)
+    years = tuple(sorted(years))
+    paths = [p for year in years for p in dataset.year_file_paths(year).values()]
+    cache = get_cache()
+
+    def compute():
+        backend = DuckDBBackend(paths)
+        progress(0.1, "Contando registros")
+        total = backend.count()
+        progress(0.3, "Calculando agregados")
+        aggregates = compute_aggregates(backend)
+        progress(0.7, "Montando o mapa de densidade")
+        bins = backend.density_bins()
+        return total, backend.columns(), aggregates, bins
+
+    summary = cache.get_or_compute("duckdb_summary", compute, paths, (years, dataset.MAP_BIN_DECIMALS))
+    progress(1.0, "Concluído")
+    return summary
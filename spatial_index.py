@@ -0,0 +1,119 @@
+"""
+Índice espacial das coordenadas dos acidentes.
+
+Uma BallTree com distância haversine, construída uma vez por versão dos
+dados e guardada no cache em disco, responde em milissegundos consultas
+por raio ("quantos acidentes a até 2 km deste ponto?"), pelos k mais
+próximos e por retângulo (bounding box), sem varrer todas as linhas.
+"""
+
+import numpy as np
+import pandas as pd
+import dataset
+import query_backend
+from disk_cache import get_cache
+
+EARTH_RADIUS_KM = 6371.0088
+POINT_COLUMNS = ["id", "latitude", "longitude", "uf", "br", "km"]
+
+def unique_accidents(points):
+    """
+    Um ponto por acidente.
+
+    O arquivo `acidentes` tem uma linha por pessoa envolvida, repetindo o
+    `id` do acidente (que também aparece no DataTran); sem deduplicar, as
+    contagens seriam de registros, não de acidentes. Linhas sem `id` são
+    mantidas. Usada no backend pandas; no DuckDB isso é feito na consulta
+    (`DuckDBBackend.accident_points`).
+    """
+    if "id" not in points.columns:
+        return points
+    ids = pd.to_numeric(points["id"], errors="coerce")
+    return points[ids.isna() | ~ids.duplicated()]
+
+class SpatialIndex:
+    """BallTree (haversine) sobre os pontos, mais um vetor ordenado por latitude para bounding boxes."""
+
+    def __init__(self, points):
+        from sklearn.neighbors import BallTree
+        points = points.dropna(subset=["latitude", "longitude"])
+        points = points[points["latitude"].between(-90, 90) & points["longitude"].between(-180, 180)]
+        self.points = points.reset_index(drop=True)
+        coords = np.radians(self.points[["latitude", "longitude"]].to_numpy(dtype=np.float64))
+        self.tree = BallTree(coords, metric="haversine") if len(coords) else None
+        self._lat_order = np.argsort(self.points["latitude"].to_numpy(), kind="stable")
+        self._sorted_lat = self.points["latitude"].to_numpy()[self._lat_order]
+
+    def __len__(self):
+        return len(self.points)
+
+    @staticmethod
+    def _query_point(lat, lon):
+        return np.radians([[lat, lon]])
+
+    def count_within(self, lat, lon, radius_km):
+        """Quantidade de acidentes a até `radius_km` do ponto."""
+        if not len(self):
+            return 0
+        return int(self.tree.query_radius(self._query_point(lat, lon), r=radius_km / EARTH_RADIUS_KM,
+                                          count_only=True)[0])
+
+    def within_radius(self, lat, lon, radius_km):
+        """Acidentes a até `radius_km` do ponto, do mais próximo ao mais distante, com `distancia_km`."""
+        if not len(self):
+            return self.points.assign(distancia_km=pd.Series(dtype="float64"))
+        idx, dist = self.tree.query_radius(self._query_point(lat, lon), r=radius_km / EARTH_RADIUS_KM,
+                                           return_distance=True, sort_results=True)
+        return self.points.iloc[idx[0]].assign(distancia_km=dist[0] * EARTH_RADIUS_KM)
+
+    def nearest(self, lat, lon, k=10):
+        """Os `k` acidentes mais próximos do ponto, com `distancia_km`."""
+        k = min(k, len(self))
+        if k == 0:
+            return self.points.assign(distancia_km=pd.Series(dtype="float64"))
+        dist, idx = self.tree.query(self._query_point(lat, lon), k=k)
+        return self.points.iloc[idx[0]].assign(distancia_km=dist[0] * EARTH_RADIUS_KM)
+
+    def in_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """Acidentes dentro do retângulo (bordas inclusas)."""
+        start = np.searchsorted(self._sorted_lat, min_lat, side="left")
+        end = np.searchsorted(self._sorted_lat, max_lat, side="right")
+        candidates = self._lat_order[start:end]
+        lon = self.points["longitude"].to_numpy()[candidates]
+        return self.points.iloc[candidates[(lon >= min_lon) & (lon <= max_lon)]]
+
+def load_index(years, backend=None, progress=None):
+    """
+    Índice espacial dos anos selecionados, via cache em disco.
+
+    Com `QUERY_BACKEND=duckdb` os pontos vêm de uma consulta que já traz só
+    as colunas necessárias, um ponto por acidente; no backend pandas, dos
+    dados já preparados, deduplicados com `unique_accidents`. Anos sem
+    dados (ou sem coordenadas) resultam em um índice vazio.
+    """
+    backend = backend or query_backend.QUERY_BACKEND
+    progress = progress or (lambda fraction, message: None)
+    years = tuple(sorted(years))
+    paths = [p for year in years for p in dataset.year_file_paths(year).values()]
+
+    def compute():
+        progress(0.1, "Lendo coordenadas")
+        points = pd.DataFrame(columns=["latitude", "longitude"])
+        if backend == "duckdb":
+            # Filtro e deduplicação no DuckDB: só um ponto por acidente chega à memória
+            source = query_backend.get_backend(years, backend="duckdb")
+            if {"latitude", "longitude"} <= source.columns():
+                points = source.accident_points([c for c in POINT_COLUMNS if c in source.columns()])
+        else:
+            frames = [dataset.load_year_bundle(year)[0] for year in years]
+            frames = [df[[c for c in POINT_COLUMNS if c in df.columns]] for df in frames
+                      if {"latitude", "longitude"} <= set(df.columns)]
+            if frames:
+                points = unique_accidents(pd.concat(frames, ignore_index=True)
+                                          .dropna(subset=["latitude", "longitude"]))
+        progress(0.5, "Construindo o índice espacial")
+        return SpatialIndex(points)
+
+    index = get_cache().get_or_compute("spatial_index", compute, paths, (years, backend))
+    progress(1.0, "Concluído")
+    return index
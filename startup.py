@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Inicialização rápida do dashboard.
+
+- `lazy_import` adia imports pesados (plotly, sklearn...) até a seção que
+  precisa deles e registra quanto tempo cada um levou.
+- `warm_up` grava no cache em disco (`disk_cache.py`) tudo o que o primeiro
+  acesso ao ano padrão calcula: com o backend pandas, o ano preparado e suas
+  agregações; com o DuckDB, o resumo da consulta. Nos dois casos também as
+  séries temporais e o índice espacial. O servidor e as demais réplicas
+  reaproveitam esses resultados.
+
+Uso antes de subir o servidor:
+    python startup.py --warmup --year 2023
+"""
+
+import os
+import sys
+import time
+import argparse
+import importlib
+
+DEFAULT_YEAR = int(os.getenv("DASHBOARD_DEFAULT_YEAR", 2023))
+PROFILE_IMPORTS = os.getenv("STARTUP_PROFILE", "0") == "1"
+
+IMPORT_TIMES = {}
+
+def lazy_import(name):
+    """Importa um módulo na primeira vez que é pedido, registrando o tempo gasto."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    IMPORT_TIMES[name] = time.perf_counter() - start
+    return module
+
+def import_report():
+    """Tempos de import registrados por `lazy_import`, em ms, do mais lento ao mais rápido."""
+    return {name: round(seconds * 1000, 1)
+            for name, seconds in sorted(IMPORT_TIMES.items(), key=lambda item: -item[1])}
+
+def warm_up(year=DEFAULT_YEAR, backend=None):
+    """
+    Prepara no cache em disco os dados do ano padrão antes da primeira requisição.
+
+    Os imports não são aquecidos: este processo não é o do servidor.
+
+    Returns:
+        dict: tempos (em segundos) de cada etapa
+    """
+    import dataset
+    import query_backend
+    import spatial_index
+    import timeseries
+    backend = backend or query_backend.QUERY_BACKEND
+    timings = {}
+    start = time.perf_counter()
+    if backend == "duckdb":
+        query_backend.summarize_years((year,))
+        timings["summarize_years"] = time.perf_counter() - start
+    else:
+        _, _, _, problems = dataset.load_year_bundle(year)
+        timings["dataset"] = time.perf_counter() - start
+        for level, message in problems:
+            print(f"[{level}] {message}")
+    start = time.perf_counter()
+    timeseries.load_cube((year,), backend)
+    timings["timeseries"] = time.perf_counter() - start
+    start = time.perf_counter()
+    spatial_index.load_index((year,), backend)
+    timings["spatial_index"] = time.perf_counter() - start
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Aquecimento do dashboard de acidentes")
+    parser.add_argument("--warmup", action="store_true", help="prepara o ano no cache em disco")
+    parser.add_argument("--backend", choices=["pandas", "duckdb"], default=None,
+                        help="backend de consulta do servidor (padrão: QUERY_BACKEND)")
+    parser.add_argument("--year", type=int, default=DEFAULT_YEAR, help="ano a preparar")
+    args = parser.parse_args()
+
+    if args.warmup:
+        timings = warm_up(args.year, args.backend)
+        for step, seconds in timings.items():
+            print(f"⏱️ {step}: {seconds * 1000:.0f} ms")
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Séries temporais pré-agregadas dos acidentes.
+
+As contagens são montadas uma única vez em arrays densos por grupo
+(uf, br, tipo_acidente): um array diário (grupos × dias) e os totais por
+dia da semana × hora (grupos × 7 × 24). O eixo de dias cobre só os anos
+presentes nos dados, então anos não selecionados não viram zeros. Médias
+móveis, reamostragem, perfis por dia da semana/feriado e comparações ano a
+ano são operações vetorizadas sobre esses arrays, com custo independente
+do número de acidentes.
+"""
+
+import datetime
+import numpy as np
+import pandas as pd
+import dataset
+import query_backend
+from disk_cache import get_cache
+
+GROUP_KEYS = ("uf", "br", "tipo_acidente")
+MISSING_LABEL = "(sem valor)"
+WEEKDAYS = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"]
+
+def easter(year):
+    """Domingo de Páscoa (algoritmo de Meeus/Jones/Butcher)."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return datetime.date(year, month, day)
+
+def national_holidays(year):
+    """Feriados nacionais (e o Carnaval) de um ano."""
+    fixed = [(1, 1), (4, 21), (5, 1), (9, 7), (10, 12), (11, 2), (11, 15), (12, 25)]
+    if year >= 2024:
+        fixed.append((11, 20))  # Dia Nacional de Zumbi e da Consciência Negra
+    holidays = {datetime.date(year, month, day) for month, day in fixed}
+    pascoa = easter(year)
+    for offset in (-48, -47, -2, 60):  # Carnaval (2ª e 3ª), Sexta-feira Santa, Corpus Christi
+        holidays.add(pascoa + datetime.timedelta(days=offset))
+    return holidays
+
+def _key_labels(values):
+    # BR vem como int (pandas) ou float com NULL (DuckDB): normaliza para "116";
+    # nulos ganham um rótulo próprio (o astype(str) do pandas 3 os mantém NaN)
+    if pd.api.types.is_numeric_dtype(values):
+        values = pd.to_numeric(values).round().astype("Int64")
+    return values.astype(str).where(values.notna(), MISSING_LABEL)
+
+def _label_order(label):
+    # Números em ordem numérica ("1", "10", "101"...), depois texto, e o rótulo de nulos por último
+    digits = label.isdigit()
+    return (label == MISSING_LABEL, not digits, int(label) if digits else 0, label)
+
+def _segment_starts(dates):
+    """Posições onde começa cada trecho de dias consecutivos do eixo."""
+    if len(dates) == 0:
+        return np.array([], dtype=np.int64)
+    gaps = np.nonzero((dates[1:] - dates[:-1]) != pd.Timedelta(days=1))[0] + 1
+    return np.concatenate([[0], gaps]).astype(np.int64)
+
+def rolling_mean(series, window):
+    """Média móvel dos últimos `window` pontos (NaN antes de completar a janela)."""
+    series = np.asarray(series, dtype=np.float64)
+    result = np.full(series.shape, np.nan)
+    if window <= len(series):
+        cumsum = np.cumsum(np.insert(series, 0, 0.0))
+        result[window - 1:] = (cumsum[window:] - cumsum[:-window]) / window
+    return result
+
+class TimeSeriesCube:
+    """
+    Contagens diárias e por dia da semana × hora, densas por grupo.
+
+    Attributes:
+        groups (pd.DataFrame): uma linha por grupo, na ordem dos arrays
+        dates (pd.DatetimeIndex): dias do eixo; do primeiro ao último dia com
+            dados de cada ano presente (pode ter lacunas entre anos)
+        daily (np.ndarray): int32, grupos × dias
+        weekday_hours (np.ndarray): int32, grupos × 7 × 24 (acidentes sem
+            horário válido entram só no diário)
+    """
+
+    def __init__(self, groups, dates, daily, weekday_hours):
+        self.groups = groups.reset_index(drop=True)
+        self.dates = pd.DatetimeIndex(dates)
+        self.daily = daily
+        self.weekday_hours = weekday_hours
+
+    @classmethod
+    def from_counts(cls, counts, keys=GROUP_KEYS):
+        """
+        Monta o cubo a partir de contagens por (grupo, `data_inversa`, `hora`) na coluna `n`.
+
+        Essas contagens vêm de `backend.count_by`, então a agregação pesada
+        é feita pelo backend (pandas ou DuckDB).
+        """
+        keys = [k for k in keys if k in counts.columns]
+        days = pd.to_datetime(counts["data_inversa"], errors="coerce").dt.normalize()
+        counts = counts.assign(data_inversa=days).dropna(subset=["data_inversa"])
+        if counts.empty:
+            return cls(pd.DataFrame(columns=keys), pd.DatetimeIndex([]),
+                       np.zeros((0, 0), np.int32), np.zeros((0, 7, 24), np.int32))
+        if keys:
+            labels = pd.DataFrame({k: _key_labels(counts[k]) for k in keys})
+            group_codes, groups = pd.MultiIndex.from_frame(labels).factorize()
+            groups = pd.DataFrame(list(groups), columns=keys)
+        else:
+            group_codes, groups = np.zeros(len(counts), dtype=np.int64), pd.DataFrame(index=[0])
+        days = counts["data_inversa"]
+        spans = days.groupby(days.dt.year).agg(["min", "max"])
+        dates = pd.DatetimeIndex(np.concatenate([
+            pd.date_range(first, last, freq="D").to_numpy() for first, last in spans.itertuples(index=False)
+        ]))
+        day_codes = dates.get_indexer(days)
+        n_groups, n_days = len(groups), len(dates)
+        n = counts["n"].to_numpy(dtype=np.int64)
+
+        daily = np.zeros(n_groups * n_days, dtype=np.int32)
+        np.add.at(daily, group_codes * n_days + day_codes, n)
+
+        hours = pd.to_numeric(counts["hora"], errors="coerce").to_numpy(dtype=np.float64) \
+            if "hora" in counts.columns else np.full(len(counts), np.nan)
+        valid = ~np.isnan(hours) & (hours >= 0) & (hours < 24)
+        weekday = days.dt.dayofweek.to_numpy()
+        weekday_hours = np.zeros(n_groups * 7 * 24, dtype=np.int32)
+        flat = (group_codes[valid] * 7 + weekday[valid]) * 24 + hours[valid].astype(np.int64)
+        np.add.at(weekday_hours, flat, n[valid])
+
+        return cls(groups, dates, daily.reshape(n_groups, n_days), weekday_hours.reshape(n_groups, 7, 24))
+
+    def options(self, key):
+        """Valores disponíveis de uma chave de grupo (para filtros), BR em ordem numérica."""
+        if key not in self.groups.columns:
+            return []
+        return sorted(self.groups[key].unique(), key=_label_order)
+
+    def select(self, **filters):
+        """Índices dos grupos que atendem aos filtros (`uf=[...]`, `br=[...]`, ...). Vazio = todos."""
+        mask = np.ones(len(self.groups), dtype=bool)
+        for key, values in filters.items():
+            if values and key in self.groups.columns:
+                mask &= self.groups[key].isin([str(v) for v in values]).to_numpy()
+        return np.nonzero(mask)[0]
+
+    def daily_series(self, groups=None):
+        """Acidentes por dia, somados nos grupos selecionados."""
+        daily = self.daily if groups is None else self.daily[groups]
+        return pd.Series(daily.sum(axis=0, dtype=np.int64), index=self.dates, name="acidentes")
+
+    def rolling_mean(self, series, window):
+        """Média móvel de uma série diária do cubo, reiniciada a cada trecho contínuo de dias."""
+        values = series.to_numpy()
+        result = np.full(len(values), np.nan)
+        bounds = list(_segment_starts(series.index)) + [len(values)]
+        for first, last in zip(bounds[:-1], bounds[1:]):
+            result[first:last] = rolling_mean(values[first:last], window)
+        return pd.Series(result, index=series.index, name=f"media_{window}d")
+
+    def resample(self, series, freq="M"):
+        """Soma uma série diária por semana (`W`, começando na segunda) ou mês (`M`)."""
+        dates = series.index
+        if freq == "W":
+            starts = np.nonzero(dates.dayofweek == 0)[0]
+        elif freq == "M":
+            starts = np.nonzero(dates.day == 1)[0]
+        else:
+            raise ValueError(f"Frequência inválida: {freq} (use 'W' ou 'M')")
+        if not len(series):
+            return pd.Series([], index=dates, name=series.name, dtype=np.int64)
+        # Cada trecho contínuo também abre um período (ex.: 2020 e 2023 sem os anos do meio)
+        starts = np.union1d(_segment_starts(dates), starts).astype(np.int64)
+        totals = np.add.reduceat(series.to_numpy(), starts)
+        return pd.Series(totals, index=dates[starts], name=series.name)
+
+    def weekday_hour_profile(self, groups=None):
+        """Média de acidentes por dia da semana × hora (7 × 24), sobre os dias do eixo."""
+        weekday_hours = self.weekday_hours if groups is None else self.weekday_hours[groups]
+        totals = weekday_hours.sum(axis=0, dtype=np.int64)
+        days_per_weekday = np.maximum(np.bincount(self.dates.dayofweek, minlength=7), 1)
+        return pd.DataFrame(totals / days_per_weekday[:, None], index=WEEKDAYS, columns=range(24))
+
+    def day_type_profile(self, groups=None):
+        """Média diária de acidentes em dias úteis, fins de semana e feriados nacionais."""
+        daily = self.daily_series(groups)
+        dates = daily.index
+        if not len(dates):
+            return pd.Series(dtype=np.float64, name="media_diaria")
+        holidays = set()
+        for year in dates.year.unique():
+            holidays |= national_holidays(year)
+        is_holiday = np.isin(dates.date, list(holidays))
+        is_weekend = dates.dayofweek.to_numpy() >= 5
+        day_type = np.where(is_holiday, "Feriado", np.where(is_weekend, "Fim de semana", "Dia útil"))
+        return daily.groupby(day_type).mean().rename("media_diaria")
+
+    def year_over_year(self, groups=None):
+        """
+        Total mensal por ano e variação (%) em relação ao mesmo mês do ano anterior.
+
+        Sem o ano anterior no eixo (não selecionado), a variação fica vazia.
+        """
+        monthly = self.resample(self.daily_series(groups), "M")
+        table = pd.DataFrame({"ano": monthly.index.year, "mes": monthly.index.month, "acidentes": monthly.to_numpy()})
+        table = table.groupby(["ano", "mes"], as_index=False)["acidentes"].sum()
+        previous = table.assign(ano=table["ano"] + 1).rename(columns={"acidentes": "ano_anterior"})
+        table = table.merge(previous, on=["ano", "mes"], how="left")
+        table["variacao_pct"] = (table["acidentes"] / table["ano_anterior"].where(table["ano_anterior"] > 0) - 1) * 100
+        return table
+
+def load_cube(years, backend=None, keys=GROUP_KEYS, progress=None):
+    """
+    Cubo dos anos selecionados, via cache em disco.
+
+    As contagens por (grupo, dia, hora) são calculadas pelo backend de
+    consulta configurado; só elas, e não as linhas, chegam ao cubo.
+    """
+    backend = backend or query_backend.QUERY_BACKEND
+    progress = progress or (lambda fraction, message: None)
+    years = tuple(sorted(years))
+    paths = [p for year in years for p in dataset.year_file_paths(year).values()]
+
+    def compute():
+        progress(0.1, "Contando acidentes por dia e hora")
+        if backend == "duckdb":
+            source = query_backend.get_backend(years, backend="duckdb")
+        else:
+            frames = [dataset.load_year_bundle(year)[0] for year in years]
+            frames = [df for df in frames if not df.empty]
+            source = query_backend.PandasBackend(pd.concat(frames, ignore_index=True) if frames else pd.DataFrame())
+        columns = source.columns()
+        if "data_inversa" not in columns:
+            return TimeSeriesCube.from_counts(pd.DataFrame(columns=["data_inversa", "n"]), keys)
+        by = [k for k in keys if k in columns] + ["data_inversa"] + (["hora"] if "hora" in columns else [])
+        counts = source.count_by(by)
+        progress(0.6, "Montando séries temporais")
+        return TimeSeriesCube.from_counts(counts, keys)
+
+    cube = get_cache().get_or_compute("timeseries", compute, paths, (years, backend, tuple(keys)))
+    progress(1.0, "Concluído")
+    return cube